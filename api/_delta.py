@@ -0,0 +1,235 @@
+# api/_delta.py
+# 增量补丁：输出文件内容变化时，与上一次发布的内容比较，写出 {output_dir}/deltas/{文件名去掉 .json}.delta.json。
+# 每个文件有单调递增的 seq (记录在 _manifest.json 中)。前端轮询 _manifest.json，seq 前进时只下载补丁；
+# 补丁的 base_seq 与本地持有的 seq 不一致 (错过了某次更新) 或补丁带 reset 标记时，重新下载完整文件。
+#
+# 补丁格式:
+#   {"file": "stock_data.json", "seq": 42, "base_seq": 41, "update_time_bjt": ..., "trade_date": ...,
+#    "fields": {顶层非列表字段的新值},
+#    "sections": {"top_up_20": {"entered": [新进入的完整记录], "exited": [离开的代码],
+#                               "changed": [{"代码": ..., 变化的字段: 新值}], "order": [新的代码顺序]}}}
+# 记录列表类文件 (观察列表等) 只有一个名为 "rows" 的 section。没有变化的键省略。
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DELTA_DIR = "deltas"
+DELTA_SUFFIX = ".delta.json"
+ROW_KEY = '代码'
+# 每行都相同的字段放在补丁顶层，不逐行比较
+ROW_LEVEL_FIELDS = ('update_time_bjt', 'trade_date')
+
+
+def delta_path(delta_dir, file):
+    return os.path.join(delta_dir, os.path.splitext(file)[0] + DELTA_SUFFIX)
+
+
+def from_columnar(payload):
+    """_publish.to_columnar 的逆变换。"""
+    if isinstance(payload, dict) and isinstance(payload.get('columns'), dict):
+        columns = payload['columns']
+        constants = {k: v for k, v in payload.items() if k != 'columns'}
+        length = max((len(values) for values in columns.values()), default=0)
+        return [{**{k: values[i] for k, values in columns.items()}, **constants} for i in range(length)]
+    if isinstance(payload, dict):
+        return {k: from_columnar(v) for k, v in payload.items()}
+    return payload
+
+
+def read_published(path, output_format):
+    """读取上一次发布的文件并还原为 payload；文件不存在或无法解析时返回 None。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return from_columnar(payload) if output_format == 'columnar' else payload
+
+
+def _is_records(value):
+    return isinstance(value, list) and all(isinstance(row, dict) and ROW_KEY in row for row in value)
+
+
+def _records_frame(records):
+    """
+    记录列表 -> 以 '代码' 为索引的 DataFrame (行级公共字段剔除)。使用 object 列，保留 None 与 NaN 的区别
+    (完整文件中二者分别写作 null 与 NaN)。
+    """
+    df = pd.DataFrame(records, dtype=object) if records else pd.DataFrame(columns=[ROW_KEY], dtype=object)
+    df[ROW_KEY] = df[ROW_KEY].astype(str)
+    df = df.drop(columns=[c for c in ROW_LEVEL_FIELDS if c in df.columns])
+    return df.set_index(ROW_KEY)
+
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def diff_records(old_records, new_records):
+    """
+    按 '代码' 比较两组记录，返回 {entered, exited, changed, order}，省略为空的键。
+    任一方有重复代码 (观察列表允许重复) 或字段不同时无法按代码表达变化，返回 None。
+    """
+    old, new = _records_frame(old_records), _records_frame(new_records)
+    if old.index.has_duplicates or new.index.has_duplicates:
+        return None
+    if len(old) and len(new) and set(old.columns) != set(new.columns):
+        return None
+    section = {}
+    entered = ~new.index.isin(old.index)
+    if entered.any():
+        # 新进入的行使用原始记录 (保持原始字段顺序与行级公共字段)
+        section['entered'] = [new_records[i] for i in np.flatnonzero(entered)]
+    exited = old.index[~old.index.isin(new.index)]
+    if len(exited):
+        section['exited'] = list(exited)
+
+    common = new.index[~entered]
+    columns = new.columns
+    before = old.reindex(index=common, columns=columns).to_numpy(dtype=object)
+    after = new.reindex(index=common, columns=columns).to_numpy(dtype=object)
+    # 逐元素比较整张表；两边都为空时只有 None 与 NaN 互换才算变化
+    both_na = pd.isna(before) & pd.isna(after)
+    differs = (before != after) & ~both_na
+    if both_na.any():
+        differs[both_na] = [(x is None) != (y is None) for x, y in zip(before[both_na], after[both_na])]
+    rows = np.flatnonzero(differs.any(axis=1))
+    if len(rows):
+        section['changed'] = [
+            {ROW_KEY: common[i], **{columns[j]: _json_value(after[i, j]) for j in np.flatnonzero(differs[i])}}
+            for i in rows
+        ]
+    if list(new.index) != list(old.index):
+        section['order'] = list(new.index)
+    return section
+
+
+def compute_delta(old_payload, new_payload):
+    """
+    计算两次发布之间的补丁内容 {"fields": ..., "sections": ...}。
+    结构不同、任一方为错误信息、记录列表中有重复代码等无法增量表达的情况返回 None，调用方应写出 reset 补丁。
+    """
+    if _is_records(old_payload) and _is_records(new_payload):
+        section = diff_records(old_payload, new_payload)
+        if section is None:
+            return None
+        return {'fields': {}, 'sections': {'rows': section} if section else {}}
+    if not (isinstance(old_payload, dict) and isinstance(new_payload, dict)):
+        return None
+    if 'error' in old_payload or 'error' in new_payload or old_payload.keys() != new_payload.keys():
+        return None
+    fields, sections = {}, {}
+    for key, value in new_payload.items():
+        if _is_records(value) and _is_records(old_payload[key]):
+            section = diff_records(old_payload[key], value)
+            if section is None:
+                return None
+            if section:
+                sections[key] = section
+        elif key not in ROW_LEVEL_FIELDS and value != old_payload[key]:
+            fields[key] = value
+    return {'fields': fields, 'sections': sections}
+
+
+def _row_level(payload, field):
+    """payload 顶层或第一条记录中的 update_time_bjt / trade_date。"""
+    if isinstance(payload, dict):
+        if field in payload:
+            return payload[field]
+        payload = next((v for v in payload.values() if _is_records(v) and v), [])
+    return payload[0].get(field) if isinstance(payload, list) and payload and isinstance(payload[0], dict) else None
+
+
+def write_delta(delta_dir, file, old_payload, new_payload, seq, update_time=None):
+    """
+    写出 file 的第 seq 号补丁，返回写入的字节数。第一个补丁 (客户端还没有对应的 seq) 或 old_payload 为 None
+    (没有上一次的内容) 时写出 reset 补丁。
+    """
+    delta = compute_delta(old_payload, new_payload) if old_payload is not None and seq > 1 else None
+    document = {
+        'file': file,
+        'seq': seq,
+        'base_seq': seq - 1 if seq > 1 else None,
+        'update_time_bjt': update_time or _row_level(new_payload, 'update_time_bjt'),
+        'trade_date': _row_level(new_payload, 'trade_date'),
+    }
+    if delta is None:
+        document['reset'] = True
+    else:
+        document.update(delta)
+    data = json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    os.makedirs(delta_dir, exist_ok=True)
+    path = delta_path(delta_dir, file)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+    return len(data)
+
+
+def apply_delta(payload, document):
+    """
+    把补丁应用到客户端持有的 payload 上，返回新的 payload (前端实现的参考)。
+    补丁为 reset 时返回 None，表示需要重新下载完整文件。
+    """
+    if document.get('reset'):
+        return None
+    row_level = {field: document[field] for field in ROW_LEVEL_FIELDS if document.get(field) is not None}
+
+    def patch(records, section):
+        rows = {str(row[ROW_KEY]): dict(row) for row in records}
+        for code in section.get('exited', []):
+            rows.pop(code, None)
+        for row in section.get('entered', []):
+            rows[str(row[ROW_KEY])] = dict(row)
+        for change in section.get('changed', []):
+            rows[str(change[ROW_KEY])].update({k: v for k, v in change.items() if k != ROW_KEY})
+        order = section.get('order', [str(row[ROW_KEY]) for row in records if str(row[ROW_KEY]) in rows])
+        return [{**rows[code], **{k: v for k, v in row_level.items() if k in rows[code]}} for code in order]
+
+    sections = document.get('sections', {})
+    if isinstance(payload, list):
+        return patch(payload, sections.get('rows', {}))
+    fields = document.get('fields', {})
+    result = {**payload, **fields}
+    for field, value in row_level.items():
+        if field in result:
+            result[field] = value
+    for key, value in payload.items():
+        # 不以代码为键的列表 (如行业聚合) 变化时整体放在 fields 中
+        if key not in fields and _is_records(value):
+            result[key] = patch(value, sections.get(key, {}))
+    return result
+
+
+class DeltaFeed:
+    """
+    轮询补丁目录，返回自上次调用以来新写出的补丁 (按文件修改时间判断)。供本地服务的 SSE 推送使用，每个连接一个实例。
+    创建时已存在的补丁视为已读。
+    """
+
+    def __init__(self, delta_dir):
+        self.delta_dir = delta_dir
+        self.seen = {}
+        self.poll()
+
+    def poll(self):
+        updates = []
+        try:
+            entries = [entry for entry in os.scandir(self.delta_dir) if entry.name.endswith(DELTA_SUFFIX)]
+        except FileNotFoundError:
+            return updates
+        for entry in entries:
+            mtime = entry.stat().st_mtime_ns
+            if self.seen.get(entry.name) == mtime:
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    document = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self.seen[entry.name] = mtime
+            updates.append(document)
+        return sorted(updates, key=lambda document: (document.get('update_time_bjt') or '', document.get('file')))
@@ -0,0 +1,146 @@
+# api/_fetch.py
+# 数据获取阶段：并发拉取 ETF / A股 / 港股 三个全市场快照，每个数据源独立超时与重试
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# 单次请求的超时时间 (秒)、失败后的重试次数、以及指数退避的基础等待时间 (秒)
+FETCH_TIMEOUT_SECONDS = 90
+FETCH_RETRIES = 2
+FETCH_BACKOFF_SECONDS = 2.0
+
+# 打印日志时使用的数据源名称
+SOURCE_LABELS = {
+    "etf": "ETFs",
+    "stock": "A-share stocks",
+    "hk_stock": "HK stocks",
+}
+
+
+def default_fetchers():
+    """
+    返回生产环境使用的 akshare 数据源。akshare 在第一次真正拉取时才导入，
+    只用本地数据或只按代码获取行情的运行没有导入开销。
+    """
+    def source(func_name):
+        def fetch():
+            import akshare as ak
+            return getattr(ak, func_name)()
+        return fetch
+
+    return {
+        "etf": source("fund_etf_spot_em"),
+        "stock": source("stock_zh_a_spot_em"),
+        "hk_stock": source("stock_hk_main_board_spot_em"),
+    }
+
+
+class StubFetcher:
+    """
+    离线测试用的替身数据源：按需注入延迟，并让前 failures 次调用抛出异常。
+    """
+
+    def __init__(self, frame, latency=0.0, failures=0, error=ConnectionError("stub failure")):
+        self.frame = frame
+        self.latency = latency
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.calls <= self.failures:
+            raise self.error
+        return self.frame.copy()
+
+
+class FetchTimeout(TimeoutError):
+    """_call_with_timeout 超时：被放弃的线程仍在运行 (数据源自身抛出的 TimeoutError 不是这个类型)。"""
+
+
+def _call_with_timeout(func, timeout):
+    """
+    在守护线程中执行 func。超时后直接放弃该线程 (不会阻塞进程退出)，并抛出 FetchTimeout。
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome['value'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise FetchTimeout(f"no response within {timeout}s")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['value']
+
+
+def fetch_with_retry(name, fetcher, timeout=FETCH_TIMEOUT_SECONDS, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF_SECONDS):
+    """
+    带超时和指数退避重试地调用单个数据源。全部尝试失败时返回空 DataFrame，与旧版的失败处理一致。
+    只对抛出的错误重试；超时的那次调用仍在后台下载，此时再发起一次完整下载只会加重上游的负载，因此超时后不再重试。
+    """
+    label = SOURCE_LABELS.get(name, name)
+    for attempt in range(retries + 1):
+        try:
+            df = _call_with_timeout(fetcher, timeout)
+            print(f"Successfully fetched {len(df)} {label}.")
+            return df
+        except FetchTimeout as e:
+            print(f"Could not fetch {label}: {e}. Not retrying while the timed-out request is still running.")
+            break
+        except Exception as e:
+            if attempt < retries:
+                delay = backoff * (2 ** attempt)
+                print(f"Could not fetch {label} (attempt {attempt + 1}/{retries + 1}): {e}. Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+            else:
+                print(f"Could not fetch {label}: {e}")
+    return pd.DataFrame()
+
+
+def fetch_market_snapshots(fetchers, timeout=FETCH_TIMEOUT_SECONDS, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF_SECONDS, metrics=None):
+    """
+    并发拉取所有数据源，总耗时约等于最慢的那个数据源。
+    返回 {数据源名称: DataFrame}，失败的数据源对应空 DataFrame。
+    metrics (_metrics.RunMetrics) 不为空时，为每个数据源记录一个 fetch 阶段 (含重试)。
+    """
+    def fetch(name, fetcher):
+        if metrics is None:
+            return fetch_with_retry(name, fetcher, timeout, retries, backoff)
+        with metrics.span('fetch', name) as span:
+            df = fetch_with_retry(name, fetcher, timeout, retries, backoff)
+            span['rows'] = len(df)
+        return df
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(len(fetchers), 1)) as executor:
+        futures = {name: executor.submit(fetch, name, fetcher) for name, fetcher in fetchers.items()}
+        snapshots = {name: future.result() for name, future in futures.items()}
+    print(f"Fetched {len(snapshots)} sources in {time.perf_counter() - started:.2f}s.")
+    return snapshots
+
+
+def resolve_trade_date(df_etf_raw, fallback):
+    """
+    从 ETF 快照的 '数据日期' 列推导交易日，取不到时使用 fallback。
+    """
+    try:
+        if not df_etf_raw.empty and '数据日期' in df_etf_raw.columns and pd.to_datetime(df_etf_raw['数据日期'].iloc[0], errors='coerce') is not pd.NaT:
+            ts = pd.to_datetime(df_etf_raw['数据日期'].iloc[0])
+            trade_date = ts.strftime('%Y-%m-%d')
+            print(f"Base trade date set to: {trade_date}")
+            return trade_date
+    except Exception as e:
+        print(f"Could not extract trade date from ETF data: {e}. Using fallback date.")
+    return fallback
@@ -0,0 +1,146 @@
+# api/_flowcache.py
+# FlowInfoBase.json / HKFlowInfoBase.json 的列式二进制缓存：
+# 源 JSON 只在内容变化时解析一次，之后以 NumPy memmap 方式按需读取少量代码。
+
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+META_FILE = "meta.json"
+CODES_FILE = "codes.npy"
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _infer_kind(values):
+    """根据非空值推断列类型: bool / int / float / str。"""
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, bool) for v in present): return 'bool'
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present): return 'int'
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present): return 'float'
+    return 'str'
+
+
+def _to_array(values, kind):
+    if kind == 'bool': return np.array([bool(v) if v is not None else False for v in values], dtype=bool)
+    if kind == 'int': return np.array([v if v is not None else 0 for v in values], dtype=np.int64)
+    if kind == 'float': return np.array([v if v is not None else np.nan for v in values], dtype=np.float64)
+    return np.array(['' if v is None else str(v) for v in values], dtype=str)
+
+
+class FlowInfoCache:
+    """
+    以排序后的代码数组为索引、每个字段一个 .npy 文件的只读缓存。
+    lookup() 用 np.searchsorted 定位请求的代码，只会读入对应的少量行。
+    """
+
+    def __init__(self, source_path, cache_dir):
+        self.source_path = source_path
+        self.cache_dir = cache_dir
+        self.fields = []
+        self._codes = np.array([], dtype=str)
+        self._columns = {}
+        self._valid = {}
+
+    @classmethod
+    def empty(cls):
+        return cls(None, None)
+
+    def __len__(self):
+        return len(self._codes)
+
+    def load(self):
+        """源文件未变化时直接映射已有缓存，否则重建。返回自身。"""
+        meta = self._read_meta()
+        stat = os.stat(self.source_path)
+        if meta and (meta['source_mtime_ns'], meta['source_size']) != (stat.st_mtime_ns, stat.st_size):
+            # mtime 变化 (例如 CI 重新 checkout) 但内容相同时无需重建，只刷新记录的 mtime
+            if meta['source_size'] == stat.st_size and meta['source_sha256'] == _file_sha256(self.source_path):
+                meta.update(source_mtime_ns=stat.st_mtime_ns)
+                self._write_meta(meta)
+            else:
+                meta = None
+        if meta is None:
+            print(f"Building flow info cache for {self.source_path} ...")
+            meta = self._rebuild(stat)
+        self._map(meta)
+        return self
+
+    def lookup(self, codes, fields=None):
+        """
+        返回以 '代码' 为索引、只包含 codes 中存在的代码的 DataFrame (object 列，空值为 None)。
+        """
+        fields = list(self.fields if fields is None else fields)
+        requested = np.array([str(code) for code in codes], dtype=str)
+        if not len(self._codes) or not len(requested):
+            return pd.DataFrame(columns=fields, index=pd.Index([], name='代码'))
+        pos = np.searchsorted(self._codes, requested)
+        pos[pos >= len(self._codes)] = 0
+        found = self._codes[pos] == requested
+        rows = pos[found]
+        data = {}
+        for field in fields:
+            if field not in self._columns:
+                data[field] = [None] * len(rows)
+                continue
+            values = self._columns[field][rows].astype(object)
+            values[~self._valid[field][rows]] = None
+            data[field] = values
+        return pd.DataFrame(data, index=pd.Index(requested[found], name='代码'), dtype=object)
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.cache_dir, META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') == CACHE_VERSION and os.path.exists(os.path.join(self.cache_dir, CODES_FILE)):
+                return meta
+        except (FileNotFoundError, ValueError):
+            pass
+        return None
+
+    def _write_meta(self, meta):
+        with open(os.path.join(self.cache_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=4)
+
+    def _rebuild(self, stat):
+        with open(self.source_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        # 代码重复时保留最后一条，与旧版 {代码: item} 字典的语义一致
+        by_code = {str(item['代码']): item for item in records}
+        codes = sorted(by_code)
+        fields = list(dict.fromkeys(k for item in records for k in item if k != '代码'))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.save(os.path.join(self.cache_dir, CODES_FILE), np.array(codes, dtype=str))
+        kinds = {}
+        for i, field in enumerate(fields):
+            values = [by_code[code].get(field) for code in codes]
+            kinds[field] = _infer_kind(values)
+            np.save(os.path.join(self.cache_dir, f"col_{i}.npy"), _to_array(values, kinds[field]))
+            np.save(os.path.join(self.cache_dir, f"valid_{i}.npy"), np.array([v is not None for v in values], dtype=bool))
+        meta = {
+            'version': CACHE_VERSION,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_size': stat.st_size,
+            'source_sha256': _file_sha256(self.source_path),
+            'rows': len(codes),
+            'fields': [{'name': field, 'kind': kinds[field]} for field in fields],
+        }
+        self._write_meta(meta)
+        return meta
+
+    def _map(self, meta):
+        self._codes = np.load(os.path.join(self.cache_dir, CODES_FILE), mmap_mode='r')
+        self.fields = [field['name'] for field in meta['fields']]
+        for i, field in enumerate(self.fields):
+            self._columns[field] = np.load(os.path.join(self.cache_dir, f"col_{i}.npy"), mmap_mode='r')
+            self._valid[field] = np.load(os.path.join(self.cache_dir, f"valid_{i}.npy"), mmap_mode='r')
@@ -0,0 +1,133 @@
+# api/_history.py
+# 盘中快照历史库：每次运行把标准化后的行情表追加为一个 Parquet 文件，按市场与交易日分区
+#   {root}/market={market}/trade_date={YYYY-MM-DD}/{YYYYMMDDTHHMMSS}.parquet  (文件名为快照的北京时间)
+# 追加只写一个新文件，不重写当天已有的分区；读取时先按文件名 (快照时间) 剪枝，再按代码做谓词下推。
+
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+
+DEFAULT_HISTORY_DIR = ".history"
+DEFAULT_KEEP_DAYS = 10
+SNAPSHOT_TIME_COLUMN = 'snapshot_time'
+SNAPSHOT_FILE_FORMAT = '%Y%m%dT%H%M%S'
+
+
+class HistoryStore:
+
+    def __init__(self, root=DEFAULT_HISTORY_DIR):
+        self.root = root
+
+    def _partition(self, market, trade_date):
+        return os.path.join(self.root, f"market={market}", f"trade_date={trade_date}")
+
+    def append(self, market, df, trade_date, snapshot_time):
+        """
+        追加一个快照。df 为 normalize_market_frame 的结果 (以 '代码' 为索引)，snapshot_time 为 'YYYY-MM-DD HH:MM:SS'。
+        同一时刻重复追加会覆盖该时刻的文件，不会产生重复快照。返回写入的文件路径。
+        """
+        ts = pd.Timestamp(snapshot_time)
+        partition = self._partition(market, trade_date)
+        os.makedirs(partition, exist_ok=True)
+        table = df.reset_index()
+        table.insert(0, SNAPSHOT_TIME_COLUMN, ts)
+        path = os.path.join(partition, ts.strftime(SNAPSHOT_FILE_FORMAT) + '.parquet')
+        tmp_path = path + '.tmp'
+        # 先写临时文件再原子替换，读取方不会看到写了一半的文件
+        table.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def trade_dates(self, market):
+        market_dir = os.path.join(self.root, f"market={market}")
+        if not os.path.isdir(market_dir):
+            return []
+        return sorted(name.split('=', 1)[1] for name in os.listdir(market_dir) if name.startswith('trade_date='))
+
+    def snapshot_files(self, market, trade_date, start=None, end=None):
+        """返回 [(快照时间, 文件路径)]，按时间排序；start/end 为 'HH:MM:SS' 或完整时间，闭区间。"""
+        partition = self._partition(market, trade_date)
+        if not os.path.isdir(partition):
+            return []
+        start = self._to_timestamp(trade_date, start)
+        end = self._to_timestamp(trade_date, end)
+        files = []
+        for name in sorted(os.listdir(partition)):
+            if not name.endswith('.parquet'):
+                continue
+            ts = pd.Timestamp(datetime.strptime(name[:-len('.parquet')], SNAPSHOT_FILE_FORMAT))
+            if (start is None or ts >= start) and (end is None or ts <= end):
+                files.append((ts, os.path.join(partition, name)))
+        return files
+
+    def read(self, market, trade_date, start=None, end=None, codes=None, columns=None):
+        """
+        读取某个交易日 [start, end] 内的快照，返回长表 (每行一个 快照时间 x 代码)。
+        codes 与 columns 会下推到 Parquet 读取，只解码需要的行与列。
+        """
+        files = [path for _, path in self.snapshot_files(market, trade_date, start, end)]
+        return self._read_files(files, codes, columns)
+
+    def _read_files(self, files, codes=None, columns=None):
+        if not files:
+            return pd.DataFrame(columns=[SNAPSHOT_TIME_COLUMN, '代码', *(columns or [])])
+        if columns is not None:
+            columns = [SNAPSHOT_TIME_COLUMN, '代码', *[c for c in columns if c not in (SNAPSHOT_TIME_COLUMN, '代码')]]
+        import pyarrow.dataset as ds
+        row_filter = ds.field('代码').isin([str(code) for code in codes]) if codes is not None else None
+        return ds.dataset(files, format='parquet').to_table(columns=columns, filter=row_filter).to_pandas()
+
+    def panel(self, market, trade_date, field='Price', start=None, end=None, codes=None):
+        """宽表: 行为快照时间，列为代码，值为 field。"""
+        df = self.read(market, trade_date, start, end, codes, [field])
+        return df.pivot_table(index=SNAPSHOT_TIME_COLUMN, columns='代码', values=field, aggfunc='last').sort_index()
+
+    def change_since_open(self, market, trade_date, field='Price', codes=None):
+        """
+        当天第一个快照到最新快照的变化，返回以 '代码' 为索引的表: first / last / change / change_pct。
+        """
+        files = self.snapshot_files(market, trade_date)
+        if not files:
+            return pd.DataFrame(columns=['first', 'last', 'change', 'change_pct'])
+        return self._compare(files[0], files[-1], field, codes)
+
+    def change_since_previous(self, market, trade_date, field='Price', codes=None):
+        """最近两个快照之间的变化 (即"自上次运行以来")。"""
+        files = self.snapshot_files(market, trade_date)
+        if len(files) < 2:
+            return pd.DataFrame(columns=['first', 'last', 'change', 'change_pct'])
+        return self._compare(files[-2], files[-1], field, codes)
+
+    def _compare(self, first, last, field, codes):
+        """first / last 为 snapshot_files 返回的 (快照时间, 文件路径)，只读取这两个文件。"""
+        (first_ts, first_path), (last_ts, last_path) = first, last
+        df = self._read_files([first_path, last_path], codes, [field])
+        wide = df.pivot_table(index='代码', columns=SNAPSHOT_TIME_COLUMN, values=field, aggfunc='last')
+        result = pd.DataFrame({
+            'first': wide[first_ts] if first_ts in wide.columns else float('nan'),
+            'last': wide[last_ts] if last_ts in wide.columns else float('nan'),
+        }, index=wide.index)
+        result['change'] = result['last'] - result['first']
+        result['change_pct'] = result['change'] / result['first'].where(result['first'] != 0) * 100
+        return result
+
+    def prune(self, keep_days=DEFAULT_KEEP_DAYS):
+        """每个市场只保留最近 keep_days 个交易日的分区，返回删除的分区数量。"""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for market_dir in os.listdir(self.root):
+            market = market_dir.split('=', 1)[-1]
+            for trade_date in self.trade_dates(market)[:-keep_days or None]:
+                shutil.rmtree(self._partition(market, trade_date))
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _to_timestamp(trade_date, value):
+        if value is None:
+            return None
+        value = str(value)
+        return pd.Timestamp(value if len(value) > 8 else f"{trade_date} {value}")
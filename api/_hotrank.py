@@ -0,0 +1,216 @@
+# api/_hotrank.py
+# 滚动 N 日热度排行的状态：每个代码保存最近 N 个交易日的日度指标 (NumPy 环形缓冲区)，以及窗口内的滚动和与有效天数。
+# 每个交易日只做一次 O(代码数) 的更新：覆盖最旧的槽位并从滚动和中减去被挤出的那一天，不对整个窗口重新求和。
+#   {dir}/{market}.npz  (np.savez，不压缩，加载时间约等于读文件时间)
+
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_HOT_RANK_DIR = ".hotrank"
+DEFAULT_WINDOW = 10
+STATE_VERSION = 1
+
+# 日度指标: 对数收益 (由涨跌幅换算，窗口内求和即为区间收益)、成交额 (亿)、主力净流入占比 (%)
+HOT_METRICS = ('return', 'amount', 'inflow')
+# 得分 = 各指标截面 z-score 的加权和；成交额先取 log1p，避免少数大盘股主导
+DEFAULT_WEIGHTS = {'return': 1.0, 'amount': 0.5, 'inflow': 0.5}
+
+
+def parse_weights(text):
+    """解析 'return=1,amount=0.5,inflow=0.5' 形式的权重配置，未提及的指标权重为 0；为空时返回默认权重。"""
+    if not text:
+        return dict(DEFAULT_WEIGHTS)
+    weights = dict.fromkeys(HOT_METRICS, 0.0)
+    for item in text.split(','):
+        metric, _, value = item.partition('=')
+        metric = metric.strip()
+        if metric not in weights:
+            raise ValueError(f"Unknown hot rank metric '{metric}', expected one of {HOT_METRICS}")
+        weights[metric] = float(value)
+    return weights
+
+
+class RollingWindow:
+    """
+    values[m, slot, i] 为代码 codes[i] 在 dates[slot] 这一天的指标 m (float32，缺失为 NaN)；
+    sums[m, i] / counts[m, i] 为窗口内的有效值之和与有效天数。head 为最新一天所在的槽位。
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.codes = np.empty(0, dtype=str)
+        self.names = np.empty(0, dtype=object)
+        self.values = np.full((len(HOT_METRICS), window, 0), np.nan, dtype=np.float32)
+        self.sums = np.zeros((len(HOT_METRICS), 0))
+        self.counts = np.zeros((len(HOT_METRICS), 0), dtype=np.int32)
+        self.dates = np.full(window, '', dtype='U10')
+        self.head = -1
+        self._index = pd.Index(self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def latest_date(self):
+        return str(self.dates[self.head]) if self.head >= 0 else None
+
+    def trade_dates(self):
+        """窗口内的交易日，由旧到新。"""
+        return [str(date) for date in self.dates[self._chronological_slots()] if date]
+
+    def update(self, trade_date, daily):
+        """
+        写入一个交易日的指标。daily 以 '代码' 为索引，包含 HOT_METRICS 中的列与 '名称'。
+        同一交易日重复写入时覆盖当天的数据；早于最新交易日的数据被忽略。返回是否写入。
+        """
+        latest = self.latest_date
+        if latest and trade_date < latest:
+            print(f"Hot rank: ignoring {trade_date}, older than the latest day {latest}.")
+            return False
+        advanced = trade_date != latest
+        if advanced:
+            self.head = (self.head + 1) % self.window
+            self.dates[self.head] = trade_date
+        self._subtract(self.head)
+        self.values[:, self.head, :] = np.nan
+
+        codes = daily.index.astype(str)
+        new_codes = codes[~codes.isin(self._index)].unique()
+        if len(new_codes):
+            self._append_codes(np.asarray(new_codes, dtype=str))
+        rows = self._index.get_indexer(codes)
+        self.values[:, self.head, rows] = daily[list(HOT_METRICS)].to_numpy(dtype=np.float32).T
+        if '名称' in daily.columns:
+            self.names[rows] = daily['名称'].to_numpy(dtype=object)
+        # 每绕环一周精确重算一次滚动和，消除反复加减的浮点累积误差 (均摊后仍为 O(代码数))
+        if advanced and self.head == 0:
+            self._recompute()
+        else:
+            self._add(self.head)
+        return True
+
+    def aggregates(self):
+        """窗口聚合结果，以 '代码' 为索引: 名称 / Return (区间涨跌幅 %) / Amount (成交额合计, 亿) / Inflow (净流入占比均值 %) / Days。"""
+        r, a, f = (HOT_METRICS.index(metric) for metric in ('return', 'amount', 'inflow'))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            inflow = self.sums[f] / self.counts[f]
+        return pd.DataFrame({
+            '名称': self.names,
+            'Return': np.where(self.counts[r] > 0, np.expm1(self.sums[r]) * 100, np.nan),
+            'Amount': np.where(self.counts[a] > 0, self.sums[a], np.nan),
+            'Inflow': inflow,
+            'Days': self.counts[r],
+        }, index=pd.Index(self.codes, name='代码'))
+
+    def resize(self, window):
+        """调整窗口长度，保留最近 min(旧, 新) 个交易日。"""
+        if window == self.window:
+            return
+        # 窗口未填满时，按时间顺序排列的槽位开头是尚未使用的空槽，只保留有日期的槽位
+        slots = self._chronological_slots()
+        keep = slots[self.dates[slots] != ''][-window:]
+        values = np.full((len(HOT_METRICS), window, len(self.codes)), np.nan, dtype=np.float32)
+        dates = np.full(window, '', dtype='U10')
+        values[:, :len(keep), :] = self.values[:, keep, :]
+        dates[:len(keep)] = self.dates[keep]
+        self.values, self.dates, self.window = values, dates, window
+        self.head = len(keep) - 1
+        self._recompute()
+
+    def compact(self):
+        """移除整个窗口内都没有数据的代码 (退市、更名后的旧代码)，返回移除的数量。"""
+        keep = self.counts.any(axis=0)
+        removed = int((~keep).sum())
+        if removed:
+            self.codes, self.names = self.codes[keep], self.names[keep]
+            self.values, self.sums, self.counts = self.values[:, :, keep], self.sums[:, keep], self.counts[:, keep]
+            self._index = pd.Index(self.codes)
+        return removed
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, version=STATE_VERSION, window=self.window, head=self.head, dates=self.dates,
+                 codes=self.codes, names=self.names.astype(str), values=self.values, sums=self.sums, counts=self.counts)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, window=DEFAULT_WINDOW):
+        """读取状态文件，不存在时返回空状态；保存时的窗口长度与 window 不同时自动调整。"""
+        state = cls(window)
+        if not os.path.exists(path):
+            return state
+        with np.load(path) as data:
+            if int(data['version']) != STATE_VERSION:
+                print(f"Hot rank: unsupported state version in {path}. Starting over.")
+                return state
+            state.window, state.head = int(data['window']), int(data['head'])
+            state.dates, state.codes, state.names = data['dates'], data['codes'], data['names'].astype(object)
+            state.values, state.sums, state.counts = data['values'], data['sums'], data['counts']
+        state._index = pd.Index(state.codes)
+        state.resize(window)
+        return state
+
+    def _chronological_slots(self):
+        if self.head < 0:
+            return np.empty(0, dtype=int)
+        return (np.arange(1, self.window + 1) + self.head) % self.window
+
+    def _append_codes(self, codes):
+        n = len(codes)
+        self.codes = np.concatenate([self.codes, codes])
+        self.names = np.concatenate([self.names, np.full(n, '', dtype=object)])
+        self.values = np.concatenate([self.values, np.full((len(HOT_METRICS), self.window, n), np.nan, dtype=np.float32)], axis=2)
+        self.sums = np.concatenate([self.sums, np.zeros((len(HOT_METRICS), n))], axis=1)
+        self.counts = np.concatenate([self.counts, np.zeros((len(HOT_METRICS), n), dtype=np.int32)], axis=1)
+        self._index = pd.Index(self.codes)
+
+    def _add(self, slot, sign=1):
+        day = self.values[:, slot, :]
+        valid = ~np.isnan(day)
+        self.sums += sign * np.where(valid, day, 0.0)
+        self.counts += sign * valid
+
+    def _subtract(self, slot):
+        self._add(slot, sign=-1)
+
+    def _recompute(self):
+        valid = ~np.isnan(self.values)
+        self.sums = np.where(valid, self.values, 0.0).sum(axis=1, dtype=np.float64)
+        self.counts = valid.sum(axis=1, dtype=np.int32)
+
+
+def daily_metrics(df_market, inflow=None):
+    """
+    由标准行情表 (normalize_market_frame 的结果) 生成一个交易日的指标表；inflow 为以代码为索引的净流入占比 (%)，
+    没有时为空值。
+    """
+    daily = pd.DataFrame(index=df_market.index)
+    daily['名称'] = df_market['名称']
+    daily['return'] = np.log1p(df_market['Percent'].to_numpy(dtype=float) / 100)
+    daily['amount'] = df_market['Amount'].to_numpy(dtype=float)
+    daily['inflow'] = inflow.reindex(df_market.index).to_numpy(dtype=float) if inflow is not None else np.nan
+    return daily[daily.index.notna()]
+
+
+def score_aggregates(agg, weights=None, min_days=1):
+    """
+    计算得分: 窗口内有效天数不少于 min_days 的代码参与排名，得分为各指标截面 z-score 的加权和。
+    某个指标缺失的代码在该项记 0 分 (即截面均值)。返回与 agg 对齐的得分序列，不参与排名的为 NaN。
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    eligible = agg['Days'].to_numpy() >= min_days
+    columns = {'return': agg['Return'], 'amount': np.log1p(agg['Amount']), 'inflow': agg['Inflow']}
+    score = np.zeros(len(agg))
+    for metric, weight in weights.items():
+        if not weight:
+            continue
+        values = columns[metric].to_numpy(dtype=float)
+        sample = values[eligible & ~np.isnan(values)]
+        if len(sample) < 2 or sample.std() == 0:
+            continue
+        z = (values - sample.mean()) / sample.std()
+        score += weight * np.nan_to_num(z, nan=0.0)
+    return pd.Series(np.where(eligible, score, np.nan), index=agg.index)
@@ -0,0 +1,136 @@
+# api/_metrics.py
+# 运行指标：记录每个阶段 (fetch / normalize / history / read / process / save) 的耗时、行数与输出字节数，
+# 以及进程峰值内存。每次运行写出 run_metrics.json (最近一次) 并追加一行到 run_metrics.jsonl (最近若干次运行的历史)。
+# 指标目录默认 data/.metrics，不随行情数据提交，避免每次运行都产生一个提交。
+
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+DEFAULT_METRICS_DIR = os.path.join("data", ".metrics")
+METRICS_FILE = "run_metrics.json"
+METRICS_LOG = "run_metrics.jsonl"
+# run_metrics.jsonl 只保留最近的这么多次运行
+METRICS_LOG_LINES = 500
+
+
+def peak_rss_mib():
+    """进程至今的峰值常驻内存 (MiB)，平台不支持时返回 None。"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上 ru_maxrss 的单位为 KiB，macOS 上为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def count_rows(payload):
+    """报表的记录条数：列表取长度，{榜单名: 列表} 取各榜单长度之和。"""
+    if isinstance(payload, list):
+        return len(payload)
+    if isinstance(payload, dict):
+        return sum(len(value) for value in payload.values() if isinstance(value, list))
+    return 0
+
+
+class RunMetrics:
+    """
+    用法:
+        metrics = RunMetrics()
+        with metrics.span('process', 'A-Share Report') as span:
+            result = process_stock_report(...)
+            span['rows'] = count_rows(result)
+        metrics.write(DEFAULT_METRICS_DIR)
+
+    span 可以在多个线程中同时使用。profile_dir 不为空时，profile() 把代码块的 cProfile 结果写到该目录。
+    """
+
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.info = {}
+        self.spans = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, name=None, **fields):
+        record = {'stage': stage, 'name': name, **fields}
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            record['start'] = round(started - self._started, 4)
+            record['seconds'] = round(time.perf_counter() - started, 4)
+            with self._lock:
+                self.spans.append(record)
+
+    @contextmanager
+    def profile(self, name):
+        """
+        cProfile 只统计当前线程，因此每个任务单独生成一个 .prof 文件。Python 3.12 起同一进程只能有一个活动的
+        profiler，调用方应串行执行被分析的任务；profiler 无法启动或写出失败时只打印警告，不影响任务本身。
+        """
+        if not self.profile_dir:
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            print(f"Could not profile {name}: {e}")
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            safe_name = ''.join(c if c.isalnum() else '_' for c in name).strip('_')
+            try:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f"profile_{safe_name}.prof"))
+            except OSError as e:
+                print(f"Could not write profile for {name}: {e}")
+
+    def summary(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda record: record['start'])
+        stages = {}
+        for record in spans:
+            stages[record['stage']] = round(stages.get(record['stage'], 0.0) + record['seconds'], 4)
+        return {
+            **self.info,
+            'total_seconds': round(time.perf_counter() - self._started, 4),
+            'peak_rss_mib': peak_rss_mib(),
+            'stage_seconds': stages,
+            'spans': spans,
+        }
+
+    def write(self, metrics_dir=DEFAULT_METRICS_DIR, max_log_lines=METRICS_LOG_LINES):
+        """写出 run_metrics.json 并追加到 run_metrics.jsonl (只保留最近 max_log_lines 行)，返回本次的指标。"""
+        summary = self.summary()
+        os.makedirs(metrics_dir, exist_ok=True)
+        with open(os.path.join(metrics_dir, METRICS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=4)
+        log_path = os.path.join(metrics_dir, METRICS_LOG)
+        lines = []
+        if os.path.exists(log_path):
+            with open(log_path, encoding='utf-8') as f:
+                lines = f.readlines()
+        lines.append(json.dumps(summary, ensure_ascii=False, separators=(',', ':')) + '\n')
+        with open(log_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.writelines(lines[-max_log_lines:])
+        os.replace(log_path + '.tmp', log_path)
+        stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in summary['stage_seconds'].items())
+        print(f"Run metrics saved to {metrics_dir}: total {summary['total_seconds']:.2f}s ({stages}), peak RSS {summary['peak_rss_mib']} MiB")
+        return summary
@@ -0,0 +1,194 @@
+# api/_publish.py
+# 输出发布：只有当行情内容真正变化时才重写 data/*.json
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import importlib.util
+import threading
+
+from _delta import read_published, write_delta
+
+MANIFEST_FILE = "_manifest.json"
+
+# 每次运行都会变化、但不代表行情变化的字段，计算内容哈希时剔除
+TIMESTAMP_FIELDS = ('update_time_bjt',)
+
+# 输出格式: pretty (缩进 4，与旧版一致) / minified (无空白) / columnar (按列存放的数组，去掉重复键)
+OUTPUT_FORMATS = ('pretty', 'minified', 'columnar')
+DEFAULT_OUTPUT_FORMAT = 'pretty'
+# 与主文件一起写出的预压缩副本: gz -> file.json.gz, br -> file.json.br
+SIDECAR_FORMATS = ('gz', 'br')
+
+# columnar 布局中，所有行取值相同时提升到外层的字段
+ROW_CONSTANT_FIELDS = ('update_time_bjt', 'trade_date')
+
+
+def strip_timestamps(payload):
+    """递归去掉 payload 中的时间戳字段，返回新的对象。"""
+    if isinstance(payload, dict):
+        return {k: strip_timestamps(v) for k, v in payload.items() if k not in TIMESTAMP_FIELDS}
+    if isinstance(payload, list):
+        return [strip_timestamps(item) for item in payload]
+    return payload
+
+
+def payload_hash(payload):
+    """不含时间戳字段的内容哈希 (sha256)。"""
+    encoded = json.dumps(strip_timestamps(payload), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def to_columnar(payload):
+    """
+    将记录列表转换为列式布局: {"update_time_bjt": ..., "trade_date": ..., "columns": {列名: [值, ...]}}。
+    字典中嵌套的记录列表 (如 top_up_20) 同样转换，其它值保持不变。
+    """
+    if isinstance(payload, dict):
+        return {k: to_columnar(v) for k, v in payload.items()}
+    if not payload or not isinstance(payload, list) or not all(isinstance(row, dict) for row in payload):
+        return payload
+    keys = list(dict.fromkeys(k for row in payload for k in row))
+    result = {}
+    for field in ROW_CONSTANT_FIELDS:
+        values = {row.get(field) for row in payload}
+        if field in keys and len(values) == 1:
+            result[field] = values.pop()
+            keys.remove(field)
+    result['columns'] = {k: [row.get(k) for row in payload] for k in keys}
+    return result
+
+
+def encode_payload(payload, output_format=DEFAULT_OUTPUT_FORMAT):
+    """按输出格式编码为 UTF-8 字节。"""
+    if output_format == 'pretty':
+        text = json.dumps(payload, ensure_ascii=False, indent=4)
+    elif output_format == 'minified':
+        text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    elif output_format == 'columnar':
+        text = json.dumps(to_columnar(payload), ensure_ascii=False, separators=(',', ':'))
+    else:
+        raise ValueError(f"Unknown output format: {output_format}. Expected one of {OUTPUT_FORMATS}.")
+    return text.encode('utf-8')
+
+
+def compress_sidecar(data, sidecar):
+    """生成预压缩副本。gzip 固定 mtime=0，内容相同时产物逐字节相同，不会产生多余的提交。"""
+    if sidecar == 'gz':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if sidecar == 'br':
+        import brotli # 可选依赖，只有启用 .br 副本时才需要
+        return brotli.compress(data, quality=11)
+    raise ValueError(f"Unknown sidecar format: {sidecar}. Expected one of {SIDECAR_FORMATS}.")
+
+
+def resolve_output_options(output_format, sidecars):
+    """
+    校验输出格式与预压缩副本配置；缺少 brotli 时跳过 .br 副本而不是让整次运行失败。
+    """
+    output_format = output_format or DEFAULT_OUTPUT_FORMAT
+    if output_format not in OUTPUT_FORMATS:
+        print(f"Warning: Unknown output format '{output_format}'. Falling back to '{DEFAULT_OUTPUT_FORMAT}'.")
+        output_format = DEFAULT_OUTPUT_FORMAT
+    resolved = []
+    for sidecar in dict.fromkeys(s.strip() for s in sidecars if s.strip()):
+        if sidecar not in SIDECAR_FORMATS:
+            print(f"Warning: Unknown sidecar format '{sidecar}'. Skipping.")
+            continue
+        if sidecar == 'br' and importlib.util.find_spec('brotli') is None:
+            print("Warning: 'brotli' is not installed. Skipping .br sidecars.")
+            continue
+        resolved.append(sidecar)
+    return output_format, tuple(resolved)
+
+
+class Manifest:
+    """
+    data/_manifest.json 记录每个输出文件上次写入时的内容哈希与更新时间。
+    只有发生变化时才回写，行情没有变化的运行不会产生任何文件改动。
+    多个报表任务并行发布时共用同一个 Manifest，record/save 加锁。
+    """
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Could not read manifest {self.path}: {e}. All outputs will be rewritten.")
+
+    def is_current(self, file, digest, output_path, output_format=DEFAULT_OUTPUT_FORMAT, sidecars=()):
+        entry = self.entries.get(file, {})
+        return (entry.get('hash') == digest
+                and entry.get('format', DEFAULT_OUTPUT_FORMAT) == output_format
+                and sorted(entry.get('sidecars', [])) == sorted(sidecars)
+                and all(os.path.exists(path) for path in [output_path, *(f"{output_path}.{ext}" for ext in sidecars)]))
+
+    def record(self, file, digest, update_time, output_format=DEFAULT_OUTPUT_FORMAT, sidecars=(), seq=None):
+        entry = {'hash': digest, 'update_time_bjt': update_time}
+        if output_format != DEFAULT_OUTPUT_FORMAT: entry['format'] = output_format
+        if sidecars: entry['sidecars'] = sorted(sidecars)
+        if seq is not None: entry['seq'] = seq
+        with self._lock:
+            self.entries[file] = entry
+            self.dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                print("Manifest unchanged.")
+                return
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=4, sort_keys=True)
+            self.dirty = False
+        print(f"Manifest saved to {self.path}")
+
+
+def publish_json(output_dir, file, payload, manifest, update_time=None, output_format=DEFAULT_OUTPUT_FORMAT, sidecars=(), stats=None, delta_dir=None):
+    """
+    内容变化时按 output_format 写入 output_dir/file (以及 sidecars 指定的预压缩副本) 并更新 manifest，返回 True；
+    内容与输出配置均未变化时保留旧文件，返回 False。
+    stats 为 dict 时写入各步骤耗时 (hash_seconds / encode_seconds / write_seconds) 与输出字节数 (bytes)。
+    delta_dir 不为空时，写入前与上一次发布的内容比较，在 delta_dir 下写出增量补丁 (见 _delta.py)，并在 manifest 中递增 seq。
+    """
+    stats = {} if stats is None else stats
+    output_path = os.path.join(output_dir, file)
+    started = time.perf_counter()
+    digest = payload_hash(payload)
+    stats['hash_seconds'] = round(time.perf_counter() - started, 4)
+    if manifest.is_current(file, digest, output_path, output_format, sidecars):
+        stats['bytes'] = os.path.getsize(output_path)
+        return False
+    previous = manifest.entries.get(file, {})
+    if delta_dir:
+        previous_payload = read_published(output_path, previous.get('format', DEFAULT_OUTPUT_FORMAT))
+    started = time.perf_counter()
+    data = encode_payload(payload, output_format)
+    stats['encode_seconds'] = round(time.perf_counter() - started, 4)
+    started = time.perf_counter()
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    for sidecar in sidecars:
+        with open(f"{output_path}.{sidecar}", 'wb') as f:
+            f.write(compress_sidecar(data, sidecar))
+    # 不再配置的预压缩副本不会再更新，删除以免协商压缩的客户端读到旧内容
+    for sidecar in SIDECAR_FORMATS:
+        if sidecar not in sidecars and os.path.exists(f"{output_path}.{sidecar}"):
+            os.remove(f"{output_path}.{sidecar}")
+    stats['write_seconds'] = round(time.perf_counter() - started, 4)
+    stats['bytes'] = len(data)
+    seq = None
+    if delta_dir:
+        started = time.perf_counter()
+        seq = previous.get('seq', 0) + 1
+        stats['delta_bytes'] = write_delta(delta_dir, file, previous_payload, payload, seq, update_time)
+        stats['delta_seconds'] = round(time.perf_counter() - started, 4)
+    manifest.record(file, digest, update_time, output_format, sidecars, seq)
+    return True
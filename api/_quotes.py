@@ -0,0 +1,199 @@
+# api/_quotes.py
+# 按代码获取行情与获取策略规划：只需要少量代码 (动态列表、观察列表) 时按代码批量请求东方财富 push2 行情接口，
+# 全市场排行榜需要更新时才下载全市场快照；按代码获取失败的市场回退到全市场下载。
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from _fetch import fetch_market_snapshots, fetch_with_retry, SOURCE_LABELS
+
+QUOTE_URL = "https://push2.eastmoney.com/api/qt/ulist.np/get"
+# 每个请求携带的代码数量、同时进行的请求数量、单个请求的超时时间 (秒)
+QUOTE_BATCH_SIZE = 100
+QUOTE_MAX_WORKERS = 4
+QUOTE_REQUEST_TIMEOUT_SECONDS = 10
+# 单个市场按代码获取的整体超时、重试次数与退避时间；失败后尽快回退到全市场下载
+QUOTE_TIMEOUT_SECONDS = 30
+QUOTE_RETRIES = 1
+QUOTE_BACKOFF_SECONDS = 0.5
+# auto 模式下代码总数超过该值时直接下载全市场快照
+TARGETED_MAX_CODES = 500
+
+# push2 字段 -> akshare 全市场快照的列名，按代码获取的结果可以直接交给 normalize_market_frame
+QUOTE_FIELDS = {
+    'f12': '代码', 'f14': '名称', 'f2': '最新价', 'f3': '涨跌幅', 'f6': '成交额',
+    'f9': '市盈率-动态', 'f23': '市净率', 'f20': '总市值', 'f124': '更新时间',
+}
+
+FETCH_MODES = ('auto', 'full', 'targeted')
+MARKETS = ('etf', 'stock', 'hk_stock')
+
+
+def market_of_code(code):
+    """
+    按代码格式判断所属市场: 5 位为港股；6 位中沪市 5 开头与深市 15/16/18 开头为基金 (ETF)，其余为 A 股。
+    """
+    code = str(code)
+    if len(code) == 5:
+        return 'hk_stock'
+    if code.startswith(('5', '15', '16', '18')):
+        return 'etf'
+    return 'stock'
+
+
+def secid(code, market):
+    """push2 接口的证券标识: 港股 116，沪市 1 (5/6/9 开头，北交所 92 开头除外)，深市与北交所 0。"""
+    if market == 'hk_stock':
+        return f"116.{code}"
+    return f"{1 if code.startswith(('5', '6', '9')) and not code.startswith('92') else 0}.{code}"
+
+
+def group_codes(*code_lists):
+    """把若干代码列表按市场归类并去重 (保持首次出现的顺序)，返回 {市场: [代码]}。"""
+    grouped = {market: {} for market in MARKETS}
+    for codes in code_lists:
+        for code in codes:
+            grouped[market_of_code(code)][str(code)] = None
+    return {market: list(codes) for market, codes in grouped.items()}
+
+
+class EastmoneyQuoteSource:
+    """
+    按代码批量获取实时行情: 代码按 batch_size 分批，最多 max_workers 个请求同时进行。
+    调用方式为 source(market, codes)，返回列名与 akshare 全市场快照一致的 DataFrame。
+    """
+
+    def __init__(self, session=None, batch_size=QUOTE_BATCH_SIZE, max_workers=QUOTE_MAX_WORKERS, timeout=QUOTE_REQUEST_TIMEOUT_SECONDS):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.session = session
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def __call__(self, market, codes):
+        batches = [codes[i:i + self.batch_size] for i in range(0, len(codes), self.batch_size)]
+        if not batches:
+            return pd.DataFrame(columns=list(QUOTE_FIELDS.values()))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            frames = list(executor.map(lambda batch: self._fetch_batch(market, batch), batches))
+        return with_trade_date(pd.concat(frames, ignore_index=True))
+
+    def _fetch_batch(self, market, codes):
+        params = {
+            'fltt': 2, 'invt': 2,
+            'fields': ','.join(QUOTE_FIELDS),
+            'secids': ','.join(secid(code, market) for code in codes),
+        }
+        response = self.session.get(QUOTE_URL, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        diff = ((response.json() or {}).get('data') or {}).get('diff') or []
+        if isinstance(diff, dict):
+            diff = list(diff.values())
+        # 停牌等情况下数值字段为 '-'，与全市场快照相同，由 normalize_market_frame 转为空值
+        return pd.DataFrame(diff, columns=list(QUOTE_FIELDS)).rename(columns=QUOTE_FIELDS)
+
+
+def with_trade_date(df):
+    """由 '更新时间' (Unix 秒) 推导 '数据日期' (北京时间)，供 resolve_trade_date 使用。"""
+    if '更新时间' in df.columns and not df.empty:
+        ts = pd.to_datetime(pd.to_numeric(df['更新时间'], errors='coerce'), unit='s', utc=True)
+        df['数据日期'] = ts.dt.tz_convert('Asia/Shanghai').dt.strftime('%Y-%m-%d')
+    return df
+
+
+class FrameQuoteSource:
+    """
+    离线测试用的替身: 从给定的全市场快照中按代码选取行 (例如 _synthetic 或回放的快照)。
+    latency 为每次调用注入的延迟，前 failures 次调用抛出异常。
+    """
+
+    def __init__(self, frames, latency=0.0, failures=0):
+        self.frames = frames
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, market, codes):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.calls <= self.failures:
+            raise ConnectionError("stub quote failure")
+        df = self.frames[market]
+        if df.empty:
+            return df.copy()
+        return df[df['代码'].astype(str).isin(codes)].reset_index(drop=True)
+
+
+class FetchPlan:
+
+    def __init__(self, strategy, codes, reason):
+        self.strategy = strategy
+        self.codes = codes
+        self.reason = reason
+
+    @property
+    def full_market(self):
+        return self.strategy == 'full'
+
+    def __repr__(self):
+        counts = ', '.join(f"{market} {len(codes)}" for market, codes in self.codes.items())
+        return f"FetchPlan({self.strategy}: {self.reason}; codes: {counts})"
+
+
+def plan_fetch(codes, mode='auto', full_reports_due=True, max_codes=TARGETED_MAX_CODES):
+    """
+    选择获取策略。codes 为 {市场: [代码]}。
+    - full: 下载全市场快照 (全市场排行榜需要更新、或代码过多时)；
+    - targeted: 只按代码获取 codes 中的行情，不生成全市场排行榜。
+    mode 为 full / targeted 时强制使用对应策略，auto 时按 full_reports_due 与代码数量决定。
+    """
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode '{mode}', expected one of {FETCH_MODES}")
+    total = sum(len(market_codes) for market_codes in codes.values())
+    if mode == 'full':
+        return FetchPlan('full', codes, "full fetch requested")
+    if mode == 'targeted':
+        return FetchPlan('targeted', codes, "targeted fetch requested")
+    if full_reports_due:
+        return FetchPlan('full', codes, "market-wide reports are due")
+    if total > max_codes:
+        return FetchPlan('full', codes, f"{total} codes exceed the targeted limit of {max_codes}")
+    return FetchPlan('targeted', codes, f"{total} codes requested")
+
+
+def fetch_planned_snapshots(plan, fetchers, quote_source, metrics=None, timeout=QUOTE_TIMEOUT_SECONDS, retries=QUOTE_RETRIES, backoff=QUOTE_BACKOFF_SECONDS):
+    """
+    按 plan 获取行情，返回与 fetch_market_snapshots 相同结构的 {市场: DataFrame}。
+    targeted 策略下各市场并发按代码获取；有代码请求但没有拿到任何行情的市场回退到全市场下载。
+    """
+    if plan.full_market:
+        return fetch_market_snapshots(fetchers, metrics=metrics)
+
+    def fetch(market):
+        codes = plan.codes.get(market) or []
+        if not codes:
+            return pd.DataFrame()
+        name = f"{SOURCE_LABELS.get(market, market)} quotes for {len(codes)} codes"
+        if metrics is None:
+            return fetch_with_retry(name, lambda: quote_source(market, codes), timeout, retries, backoff)
+        with metrics.span('fetch', f"{market} (targeted)", codes=len(codes)) as span:
+            df = fetch_with_retry(name, lambda: quote_source(market, codes), timeout, retries, backoff)
+            span['rows'] = len(df)
+        return df
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+        futures = {market: executor.submit(fetch, market) for market in fetchers}
+        snapshots = {market: future.result() for market, future in futures.items()}
+    print(f"Fetched quotes for {sum(len(df) for df in snapshots.values())} codes in {time.perf_counter() - started:.2f}s.")
+
+    fallback = {market: fetchers[market] for market, df in snapshots.items() if df.empty and plan.codes.get(market)}
+    if fallback:
+        print(f"Targeted fetch returned nothing for {', '.join(fallback)}. Falling back to full-market snapshots.")
+        snapshots.update(fetch_market_snapshots(fallback, metrics=metrics))
+    return snapshots
@@ -0,0 +1,71 @@
+# api/_replay.py
+# 原始行情快照的录制与回放：把三个数据源的原始 DataFrame 以 Feather 格式保存，
+# 回放时直接读取，不访问网络、也不导入 akshare，可离线、确定性地重跑完整的处理流程。
+#   {dir}/etf.feather, stock.feather, hk_stock.feather, meta.json (交易日与快照时间)
+
+import os
+import json
+
+import pandas as pd
+
+from _fetch import StubFetcher
+
+RECORDING_VERSION = 1
+RECORDING_META = "meta.json"
+
+
+def record_snapshots(record_dir, snapshots, trade_date, snapshot_time):
+    """保存 {数据源名称: 原始 DataFrame} 以及交易日、快照时间，返回 meta。"""
+    os.makedirs(record_dir, exist_ok=True)
+    stringified = {}
+    for name, df in snapshots.items():
+        path = os.path.join(record_dir, f"{name}.feather")
+        df, stringified[name] = _to_arrow_compatible(df)
+        df.to_feather(path + '.tmp')
+        os.replace(path + '.tmp', path)
+    meta = {
+        'version': RECORDING_VERSION,
+        'trade_date': trade_date,
+        'snapshot_time': snapshot_time,
+        'rows': {name: len(df) for name, df in snapshots.items()},
+        'stringified_columns': {name: cols for name, cols in stringified.items() if cols},
+    }
+    with open(os.path.join(record_dir, RECORDING_META), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4)
+    print(f"Recorded {', '.join(f'{n} {r} rows' for n, r in meta['rows'].items())} to {record_dir}")
+    return meta
+
+
+def _to_arrow_compatible(df):
+    """
+    Feather 要求默认的 RangeIndex 与字符串列名，且一列只能有一种类型。akshare 的数值列在停牌等情况下
+    会混入 '-' 之类的字符串，这类混合类型的列按字符串保存 (空值保持为空)；标准化时 pd.to_numeric
+    对字符串与数值的解析结果相同。返回 (DataFrame, 转为字符串的列名列表)。
+    """
+    df = df.reset_index(drop=True)
+    df.columns = [str(col) for col in df.columns]
+    stringified = []
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            stringified.append(col)
+    return df, stringified
+
+
+def load_recording(record_dir):
+    """读取录制的快照，返回 ({数据源名称: DataFrame}, meta)。"""
+    with open(os.path.join(record_dir, RECORDING_META), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != RECORDING_VERSION:
+        raise ValueError(f"Unsupported recording version {meta.get('version')} in {record_dir}")
+    snapshots = {name: pd.read_feather(os.path.join(record_dir, f"{name}.feather")) for name in meta['rows']}
+    return snapshots, meta
+
+
+def replay_fetchers(record_dir):
+    """
+    返回与 _fetch.default_fetchers() 结构相同的数据源 (每次调用返回录制的快照) 以及 meta。
+    """
+    snapshots, meta = load_recording(record_dir)
+    print(f"Replaying snapshots recorded at {meta['snapshot_time']} from {record_dir}")
+    return {name: StubFetcher(df) for name, df in snapshots.items()}, meta
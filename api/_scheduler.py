@@ -0,0 +1,129 @@
+# api/_scheduler.py
+# 报表任务调度：按数据依赖声明任务，用线程池并行执行互不依赖的任务，并报告关键路径耗时。
+# 选用线程池而不是进程池：各任务共享同一份标准化行情表，进程池需要为每个任务序列化整张表。
+
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class TaskRef:
+    """任务参数中的占位符，运行时替换为任务 name 的返回值，并自动成为依赖。"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class TaskResult:
+
+    def __init__(self, name):
+        self.name = name
+        self.value = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def duration(self):
+        return (self.finished - self.started) if self.finished is not None else 0.0
+
+
+class TaskScheduler:
+    """
+    用法:
+        scheduler = TaskScheduler()
+        report = scheduler.add("A-Share Report", process_stock_report, df_stock, trade_date)
+        scheduler.add("A-Share Report (save)", save, "stock_data.json", TaskRef(report))
+        results = scheduler.run()
+
+    单个任务抛出的异常只记录在其 TaskResult 中，不影响其它任务；依赖失败的任务不会执行。
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._tasks = {}
+
+    def add(self, name, func, *args, deps=(), **kwargs):
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task name: {name}")
+        refs = [arg.name for arg in (*args, *kwargs.values()) if isinstance(arg, TaskRef)]
+        missing = [dep for dep in (*deps, *refs) if dep not in self._tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown tasks: {missing}")
+        self._tasks[name] = (func, args, kwargs, list(dict.fromkeys((*deps, *refs))))
+        return name
+
+    def run(self):
+        """执行所有任务，返回 {任务名: TaskResult}。"""
+        results = {name: TaskResult(name) for name in self._tasks}
+        pending = dict(self._tasks)
+        running = {}
+        self.started = time.perf_counter()
+
+        def resolve(value):
+            return results[value.name].value if isinstance(value, TaskRef) else value
+
+        def execute(name, func, args, kwargs):
+            result = results[name]
+            result.started = time.perf_counter()
+            try:
+                result.value = func(*[resolve(a) for a in args], **{k: resolve(v) for k, v in kwargs.items()})
+            except Exception as e:
+                print(f"[{name}] -> Task failed: {e}")
+                traceback.print_exc()
+                result.error = e
+            finally:
+                result.finished = time.perf_counter()
+            return name
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, (func, args, kwargs, deps) in list(pending.items()):
+                    if any(dep in pending or dep in running.values() for dep in deps):
+                        continue
+                    del pending[name]
+                    failed = [dep for dep in deps if not results[dep].ok]
+                    if failed:
+                        results[name].error = RuntimeError(f"Skipped because dependencies failed: {failed}")
+                        print(f"[{name}] -> {results[name].error}")
+                        continue
+                    running[executor.submit(execute, name, func, args, kwargs)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+        self.finished = time.perf_counter()
+        self.results = results
+        return results
+
+    def critical_path(self):
+        """返回 (关键路径上的任务名列表, 关键路径总耗时)。关键路径为依赖链中任务耗时之和最大的一条。"""
+        best = {}
+        for name in self._topological_order():
+            deps = self._tasks[name][3]
+            prev = max(deps, key=lambda dep: best[dep][1], default=None)
+            path, total = (best[prev][0], best[prev][1]) if prev else ([], 0.0)
+            best[name] = (path + [name], total + self.results[name].duration)
+        return max(best.values(), key=lambda item: item[1], default=([], 0.0))
+
+    def _topological_order(self):
+        # add() 要求依赖先于任务注册，注册顺序即为拓扑序
+        return list(self._tasks)
+
+    def print_summary(self):
+        path, total = self.critical_path()
+        wall = self.finished - self.started
+        busy = sum(result.duration for result in self.results.values())
+        failed = [name for name, result in self.results.items() if not result.ok]
+        print(f"\n--- Task Summary: {len(self.results)} tasks, {len(failed)} failed, {self.max_workers} workers ---")
+        print(f"Wall-clock {wall:.3f}s, total task time {busy:.3f}s, critical path {total:.3f}s:")
+        print("  " + " -> ".join(f"{name} ({self.results[name].duration:.3f}s)" for name in path))
+        if failed:
+            print(f"Failed tasks: {', '.join(failed)}")
@@ -0,0 +1,348 @@
+# api/_server.py
+# 本地行情快照服务：常驻内存保存最新的标准化 ETF / A股 / 港股 行情表，后台定时刷新，
+# 并通过 HTTP 直接回答 dynamiclist / dynamicHKlist 查询，无需触发 GitHub Workflow。
+#
+# 用法:
+#   python api/_server.py --port 8000                 # 使用 akshare 实时数据
+#   python api/_server.py --port 8000 --stub          # 使用合成数据 (离线开发/测试)
+#
+# 查询:
+#   curl -X POST localhost:8000/ -d '{"dynamiclist": ["600519"], "dynamicHKlist": ["00700"]}'
+#   curl 'localhost:8000/dynamiclist?codes=600519,000001'
+#   curl localhost:8000/status
+#   curl -N localhost:8000/events                      # 输出文件增量补丁推送 (Server-Sent Events)
+
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from _delta import DEFAULT_DELTA_DIR, DeltaFeed
+from _fetch import default_fetchers, fetch_market_snapshots, resolve_trade_date
+from index import bjt_now, normalize_market_frame, read_flow_info_base, process_dynamic_a_share_report, process_dynamic_hk_share_report
+
+DEFAULT_REFRESH_SECONDS = 60
+# 快照超过该时长仍未刷新成功时，查询会等待一次同步刷新，而不是继续返回旧数据
+DEFAULT_MAX_STALE_SECONDS = 900
+MARKETS = ('etf', 'stock', 'hk_stock')
+# /events 检查补丁目录的间隔，以及没有新补丁时发送保活注释的间隔 (秒)
+EVENTS_POLL_SECONDS = 1.0
+EVENTS_KEEPALIVE_SECONDS = 15.0
+
+
+class Snapshot:
+    """一次刷新得到的标准化行情表 (只读)。version 每次刷新递增，用于区分查询结果缓存。"""
+
+    def __init__(self, version, frames, trade_date, update_time):
+        self.version = version
+        self.frames = frames
+        self.trade_date = trade_date
+        self.update_time = update_time
+        self.fetched_at = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+
+class SnapshotStore:
+    """
+    持有最新快照并负责刷新。同一时刻最多只有一次刷新在进行，并发的刷新请求共享同一个 Future。
+    读取采用 stale-while-revalidate：快照超过 refresh_interval 时先返回旧快照并在后台刷新，
+    超过 max_stale 时才同步等待刷新结果。
+    """
+
+    def __init__(self, fetchers, refresh_interval=DEFAULT_REFRESH_SECONDS, max_stale=DEFAULT_MAX_STALE_SECONDS):
+        self.fetchers = fetchers
+        self.refresh_interval = refresh_interval
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refreshing = None
+        self._stopped = threading.Event()
+        self._worker = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def refresh(self):
+        """开始一次刷新 (已有刷新在进行时直接复用)，返回该次刷新的 Future。"""
+        with self._lock:
+            if self._refreshing is not None:
+                return self._refreshing
+            future = self._refreshing = Future()
+        threading.Thread(target=self._run_refresh, args=(future,), daemon=True).start()
+        return future
+
+    def _run_refresh(self, future):
+        try:
+            future.set_result(self._build_snapshot())
+        except Exception as e:
+            print(f"Snapshot refresh failed: {e}")
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._refreshing = None
+
+    def _build_snapshot(self):
+        raw = fetch_market_snapshots(self.fetchers)
+        previous = self._snapshot
+        if all(raw[market].empty for market in MARKETS) and previous is None:
+            raise RuntimeError("All underlying data sources failed to fetch data.")
+        frames = {}
+        for market in MARKETS:
+            if raw[market].empty and previous is not None:
+                # 单个市场拉取失败时沿用上一份数据，避免查询结果整体缺失
+                print(f"Keeping previous {market} frame ({len(previous.frames[market])} rows).")
+                frames[market] = previous.frames[market]
+            else:
+                frames[market] = normalize_market_frame(raw[market], market)
+        fallback_date = previous.trade_date if previous else bjt_now()[:10]
+        snapshot = Snapshot((previous.version + 1) if previous else 1, frames, resolve_trade_date(raw['etf'], fallback_date), bjt_now())
+        self._snapshot = snapshot
+        print(f"Snapshot v{snapshot.version} ready: " + ", ".join(f"{market}={len(frames[market])}" for market in MARKETS))
+        return snapshot
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh().result()
+        age = snapshot.age()
+        if age > self.max_stale:
+            try:
+                return self.refresh().result()
+            except Exception:
+                return snapshot # 刷新失败时仍返回旧快照，响应中的 snapshot_age_seconds 会体现陈旧程度
+        if age > self.refresh_interval:
+            self.refresh()
+        return snapshot
+
+    def start(self):
+        """启动后台定时刷新线程。"""
+        def loop():
+            while not self._stopped.wait(self.refresh_interval):
+                try:
+                    self.refresh().result()
+                except Exception:
+                    pass
+        self._worker = threading.Thread(target=loop, daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stopped.set()
+
+
+class QueryCoalescer:
+    """
+    合并相同的并发查询：同一个 key 同一时刻只计算一次，其它请求等待同一结果。
+    结果按快照版本缓存，快照更新后自动失效。
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = {}
+        self._version = None
+
+    def run(self, version, key, func):
+        with self._lock:
+            if version != self._version:
+                self._results.clear()
+                self._version = version
+            if key in self._results:
+                return self._results[key]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if future.exception() is None and version == self._version:
+                    if len(self._results) >= self.max_entries:
+                        self._results.pop(next(iter(self._results)))
+                    self._results[key] = future.result()
+
+
+class SnapshotService:
+    """回答 dynamiclist / dynamicHKlist 查询。"""
+
+    def __init__(self, store, flow_info, hk_flow_info):
+        self.store = store
+        self.flow_info = flow_info
+        self.hk_flow_info = hk_flow_info
+        self.coalescer = QueryCoalescer()
+
+    def query(self, dynamic_a_list=None, dynamic_hk_list=None):
+        snapshot = self.store.get()
+        response = {
+            "update_time_bjt": snapshot.update_time,
+            "trade_date": snapshot.trade_date,
+            "snapshot_version": snapshot.version,
+            "snapshot_age_seconds": round(snapshot.age(), 3),
+        }
+        if dynamic_a_list:
+            codes = tuple(str(code) for code in dynamic_a_list)
+            response['dynamiclist'] = self.coalescer.run(snapshot.version, ('dynamiclist', codes), lambda: process_dynamic_a_share_report(
+                snapshot.frames['stock'], snapshot.trade_date, list(codes), self.flow_info, snapshot.update_time))
+        if dynamic_hk_list:
+            codes = tuple(str(code) for code in dynamic_hk_list)
+            response['dynamicHKlist'] = self.coalescer.run(snapshot.version, ('dynamicHKlist', codes), lambda: process_dynamic_hk_share_report(
+                snapshot.frames['hk_stock'], snapshot.trade_date, list(codes), self.hk_flow_info, snapshot.update_time))
+        return response
+
+    def status(self):
+        snapshot = self.store.snapshot
+        if snapshot is None:
+            return {"ready": False}
+        return {
+            "ready": True,
+            "update_time_bjt": snapshot.update_time,
+            "trade_date": snapshot.trade_date,
+            "snapshot_version": snapshot.version,
+            "snapshot_age_seconds": round(snapshot.age(), 3),
+            "rows": {market: len(frame) for market, frame in snapshot.frames.items()},
+        }
+
+
+def make_handler(service, allowed_origin="*", delta_dir=None):
+    class handler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status_code, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status_code)
+            self.send_header('Content-type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Access-Control-Allow-Origin', allowed_origin)
+            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_OPTIONS(self):
+            self._send_json(200, {})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/status':
+                return self._send_json(200, service.status())
+            if url.path == '/events':
+                return self._stream_events()
+            codes = [code for value in parse_qs(url.query).get('codes', []) for code in value.split(',') if code]
+            if url.path == '/dynamiclist':
+                return self._respond(codes, None)
+            if url.path == '/dynamicHKlist':
+                return self._respond(None, codes)
+            self._send_json(404, {"error": f"Unknown path: {url.path}"})
+
+        def do_POST(self):
+            # 请求体与 api/trigger.py 相同: {"dynamiclist": [...], "dynamicHKlist": [...]}
+            content_length = int(self.headers.get('Content-Length', 0))
+            try:
+                post_data = json.loads(self.rfile.read(content_length) or b'{}')
+            except ValueError: # JSONDecodeError 与非 UTF-8 请求体的 UnicodeDecodeError
+                return self._send_json(400, {"error": "Invalid JSON format in request body."})
+            if not isinstance(post_data, dict):
+                return self._send_json(400, {"error": "Request body must be a JSON object."})
+            dynamic_a_list = post_data.get('dynamiclist') if isinstance(post_data.get('dynamiclist'), list) else None
+            dynamic_hk_list = post_data.get('dynamicHKlist') if isinstance(post_data.get('dynamicHKlist'), list) else None
+            self._respond(dynamic_a_list, dynamic_hk_list)
+
+        def _stream_events(self):
+            """
+            以 SSE 推送 index.py 写出的增量补丁 (_delta.py)，每个补丁一条 delta 事件，id 为 '文件名:seq'。
+            连接建立之前已存在的补丁不推送，客户端应先下载完整文件。客户端断开时结束。
+            """
+            if not delta_dir:
+                return self._send_json(404, {"error": "Delta publishing is not configured."})
+            feed = DeltaFeed(delta_dir)
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', allowed_origin)
+            self.end_headers()
+            last_sent = time.monotonic()
+            try:
+                while True:
+                    for document in feed.poll():
+                        data = json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+                        self.wfile.write(f"event: delta\nid: {document.get('file')}:{document.get('seq')}\ndata: {data}\n\n".encode('utf-8'))
+                        last_sent = time.monotonic()
+                    if time.monotonic() - last_sent >= EVENTS_KEEPALIVE_SECONDS:
+                        self.wfile.write(b": keepalive\n\n")
+                        last_sent = time.monotonic()
+                    self.wfile.flush()
+                    time.sleep(EVENTS_POLL_SECONDS)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _respond(self, dynamic_a_list, dynamic_hk_list):
+            if not dynamic_a_list and not dynamic_hk_list:
+                return self._send_json(400, {"error": "Provide a non-empty 'dynamiclist' or 'dynamicHKlist'."})
+            try:
+                self._send_json(200, service.query(dynamic_a_list, dynamic_hk_list))
+            except Exception as e:
+                self._send_json(503, {"error": f"Snapshot unavailable: {e}"})
+
+        def log_message(self, format, *args):
+            pass # 请求日志由上层打印，避免高频查询刷屏
+
+    return handler
+
+
+def create_server(host, port, fetchers, data_dir="data", refresh_interval=DEFAULT_REFRESH_SECONDS, max_stale=DEFAULT_MAX_STALE_SECONDS, allowed_origin="*"):
+    """创建 (但不启动) 服务。返回 (server, store)，便于测试中控制生命周期。"""
+    store = SnapshotStore(fetchers, refresh_interval, max_stale)
+    service = SnapshotService(
+        store,
+        read_flow_info_base(os.path.join(data_dir, "FlowInfoBase.json")),
+        read_flow_info_base(os.path.join(data_dir, "HKFlowInfoBase.json")),
+    )
+    server = ThreadingHTTPServer((host, port), make_handler(service, allowed_origin, os.path.join(data_dir, DEFAULT_DELTA_DIR)))
+    server.daemon_threads = True
+    return server, store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve dynamic list queries from an in-memory market snapshot.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--refresh-interval', type=float, default=DEFAULT_REFRESH_SECONDS, help='Seconds between background refreshes.')
+    parser.add_argument('--max-stale', type=float, default=DEFAULT_MAX_STALE_SECONDS, help='Oldest snapshot age (seconds) served without waiting for a refresh.')
+    parser.add_argument('--stub', action='store_true', help='Use synthetic market data instead of akshare.')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='Seconds of latency injected into each synthetic fetch.')
+    args = parser.parse_args()
+
+    if args.stub:
+        from _synthetic import stub_fetchers
+        fetchers = stub_fetchers(latency=args.stub_latency)
+    else:
+        fetchers = default_fetchers()
+
+    server, store = create_server(args.host, args.port, fetchers, args.data_dir, args.refresh_interval, args.max_stale, os.environ.get('SERVER_ALLOWED_ORIGIN', '*'))
+    print("--- Loading Initial Snapshot ---")
+    store.refresh().result()
+    store.start()
+    print(f"Serving on http://{args.host}:{args.port} (refresh every {args.refresh_interval:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.stop()
+        server.server_close()
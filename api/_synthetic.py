@@ -0,0 +1,90 @@
+# api/_synthetic.py
+# 合成行情数据：生成与 akshare 实时行情接口列名一致的 DataFrame，用于离线运行、测试替身与基准测试。
+
+import time
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# 各市场代码前缀 (A股含 4/8 开头的北交所/新三板代码，用于覆盖过滤逻辑)
+STOCK_PREFIXES = ['0', '3', '6', '8', '4']
+ETF_PREFIXES = ['51', '15']
+
+
+def synthetic_codes(market, rows):
+    """生成 rows 个互不重复、形如真实代码的字符串。"""
+    i = np.arange(rows)
+    if market == 'stock':
+        prefixes = np.array(STOCK_PREFIXES)[i % len(STOCK_PREFIXES)]
+        return [p + f"{n:05d}" for p, n in zip(prefixes, i // len(STOCK_PREFIXES))]
+    if market == 'etf':
+        prefixes = np.array(ETF_PREFIXES)[i % len(ETF_PREFIXES)]
+        return [p + f"{n:04d}" for p, n in zip(prefixes, i // len(ETF_PREFIXES))]
+    return [f"{n + 1:05d}" for n in i]
+
+
+def synthetic_spot_frame(market, rows, seed=0, trade_date='2026-08-21', nan_ratio=0.005):
+    """
+    生成一个市场的实时行情快照，列名与 fund_etf_spot_em / stock_zh_a_spot_em / stock_hk_main_board_spot_em 一致。
+    约 nan_ratio 比例的数值为空，A股约 2% 的名称带 ST/退 标记。
+    """
+    rng = np.random.default_rng(seed)
+    codes = synthetic_codes(market, rows)
+    prev_close = np.round(rng.lognormal(2.5, 0.9, rows), 3 if market != 'stock' else 2)
+    percent = np.round(np.clip(rng.normal(0, 2.5, rows), -30, 30), 2)
+    price = np.round(prev_close * (1 + percent / 100), 3 if market != 'stock' else 2)
+    df = pd.DataFrame({
+        '序号': np.arange(1, rows + 1),
+        '代码': codes,
+        '名称': [f"{'港股' if market == 'hk_stock' else 'ETF' if market == 'etf' else '股票'}{n}" for n in range(rows)],
+        '最新价': price,
+        '涨跌幅': percent,
+        '涨跌额': np.round(price - prev_close, 3),
+        '成交量': rng.integers(0, 50_000_000, rows).astype(float),
+        '成交额': np.round(rng.lognormal(18, 1.8, rows), 0),
+        '昨收': prev_close,
+    })
+    if market == 'stock':
+        flagged = rng.random(rows) < 0.02
+        df.loc[flagged, '名称'] = np.where(rng.random(flagged.sum()) < 0.8, '*ST', '退市') + df.loc[flagged, '名称']
+        df['市盈率-动态'] = np.round(rng.normal(35, 60, rows), 2)
+        df['市净率'] = np.round(rng.lognormal(0.8, 0.7, rows), 2)
+        df['总市值'] = np.round(rng.lognormal(23, 1.2, rows), 0)
+        df['流通市值'] = np.round(df['总市值'] * rng.uniform(0.3, 1.0, rows), 0)
+    elif market == 'etf':
+        df['数据日期'] = trade_date
+    for col in ['最新价', '涨跌幅', '成交额']:
+        df.loc[rng.random(rows) < nan_ratio, col] = np.nan
+    return df
+
+
+def stub_fetchers(rows=None, latency=0.0, seed=0, trade_date='2026-08-21'):
+    """
+    返回与 _fetch.default_fetchers() 结构相同的合成数据源。每次调用生成新的随机行情，模拟价格变动；
+    latency 为每次调用注入的延迟 (秒)。
+    """
+    rows = {'etf': 1_000, 'stock': 5_000, 'hk_stock': 2_500, **(rows or {})}
+    seeds = itertools.count(seed)
+
+    def make(market):
+        def fetch():
+            if latency:
+                time.sleep(latency)
+            return synthetic_spot_frame(market, rows[market], seed=next(seeds), trade_date=trade_date)
+        return fetch
+
+    return {market: make(market) for market in ('etf', 'stock', 'hk_stock')}
+
+
+def synthetic_watchlist(universe, size, seed=0, missing_ratio=0.02):
+    """
+    从 universe (代码列表) 中抽取 size 个代码组成观察列表；size 超过 universe 时允许重复。
+    约 missing_ratio 比例替换为不存在的代码，覆盖"未找到"分支。
+    """
+    rng = np.random.default_rng(seed)
+    universe = np.asarray(universe, dtype=str)
+    codes = rng.choice(universe, size=size, replace=size > len(universe)).astype(object)
+    missing = rng.random(size) < missing_ratio
+    codes[missing] = [f"X{n:05d}" for n in range(missing.sum())]
+    return list(codes)
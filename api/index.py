@@ -3,10 +3,21 @@
 
 import os
 import json
+import numpy as np
 import pandas as pd
-import akshare as ak
 from datetime import datetime, timezone, timedelta
 
+from _fetch import default_fetchers, resolve_trade_date
+from _flowcache import FlowInfoCache
+from _history import DEFAULT_HISTORY_DIR, DEFAULT_KEEP_DAYS, HistoryStore
+from _publish import Manifest, publish_json, resolve_output_options
+from _delta import DEFAULT_DELTA_DIR
+from _scheduler import DEFAULT_MAX_WORKERS, TaskRef, TaskScheduler
+from _metrics import DEFAULT_METRICS_DIR, RunMetrics, count_rows
+from _replay import record_snapshots, replay_fetchers
+from _hotrank import DEFAULT_HOT_RANK_DIR, DEFAULT_WINDOW, RollingWindow, daily_metrics, parse_weights, score_aggregates
+from _quotes import FETCH_MODES, EastmoneyQuoteSource, FrameQuoteSource, fetch_planned_snapshots, group_codes, plan_fetch
+
 # --- 辅助函数 ---
 def read_watchlist_from_json(file_path):
     # ... (代码不变)
@@ -26,228 +37,381 @@ def read_watchlist_from_json(file_path):
         return []
 
 # --- 辅助函数 (已修正) ---
-def read_flow_info_base(file_path):
+# flow info 二进制缓存所在的子目录 (位于源 JSON 所在目录下，不纳入版本库)
+FLOW_CACHE_DIR = ".cache"
+
+def read_flow_info_base(file_path, cache_dir=None):
     """
-    读取 FlowInfoBase.json 并将其转换为以股票代码为键的字典以便快速查找。
+    读取 FlowInfoBase.json / HKFlowInfoBase.json，返回以股票代码为索引的 FlowInfoCache。
+    源文件只在内容变化时解析并转换为二进制缓存 (默认位于同目录的 .cache 下)，之后按代码按需读取。
     """
     print(f"Reading flow info from: {file_path}")
+    if cache_dir is None:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        cache_dir = os.path.join(os.path.dirname(file_path), FLOW_CACHE_DIR, name)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        # <-- [修正] 将 'code' 修改为 '代码'，以匹配JSON文件中的实际键名 -->
-        flow_map = {str(item['代码']): item for item in data}
-        print(f"Successfully created a lookup map for {len(flow_map)} codes from flow info.")
-        return flow_map
+        flow_info = FlowInfoCache(file_path, cache_dir).load()
+        print(f"Successfully created a lookup map for {len(flow_info)} codes from flow info.")
+        return flow_info
     except FileNotFoundError:
         print(f"Warning: Flow info file not found: {file_path}. Extra fields will be empty.")
-        return {}
+        return FlowInfoCache.empty()
     except Exception as e:
         print(f"Error reading or processing flow info file {file_path}: {e}")
-        # 如果出错（比如键名错误），返回空字典，避免程序崩溃
-        return {}
+        # 如果出错（比如键名错误），返回空缓存，避免程序崩溃
+        return FlowInfoCache.empty()
 
-# --- 原有处理函数 (保持不变) ---
-def process_etf_report(df_raw, trade_date):
-    # ... (代码不变)
-    print("--- (1/x) Processing ETF Data ---")
-    required_columns = ['代码', '名称', '最新价', '涨跌幅', '成交额']
-    df = df_raw[required_columns].copy(); df.rename(columns={'最新价': 'Price', '涨跌幅': 'Percent', '成交额': 'Amount'}, inplace=True)
-    for col in ['Price', 'Percent', 'Amount']: df[col] = pd.to_numeric(df[col], errors='coerce')
-    df.dropna(inplace=True); df['Amount'] = (df['Amount'] / 100_000_000).round(2); df['Price'] = df['Price'].round(3); df['Percent'] = df['Percent'].round(2)
+# --- 数据标准化 ---
+# 各市场原始列名 -> 统一列名。成交额、总市值在标准化阶段统一换算为"亿"。
+MARKET_COLUMNS = {
+    'etf': {'最新价': 'Price', '涨跌幅': 'Percent', '成交额': 'Amount'},
+    'stock': {'最新价': 'Price', '涨跌幅': 'Percent', '成交额': 'Amount', '市盈率-动态': 'PE_TTM', '市净率': 'PB', '总市值': 'TotalMarketCap'},
+    'hk_stock': {'最新价': 'Price', '涨跌幅': 'Percent', '成交额': 'Amount'},
+}
+UNIT_100M_COLUMNS = ['Amount', 'TotalMarketCap']
+
+def normalize_market_frame(df_raw, market):
+    """
+    将 akshare 原始快照转换为以 '代码' 为索引的标准行情表，每次运行每个市场只做一次。
+    数值列已转换为数值类型，金额单位已换算为亿；A股额外预先计算 ST/退市 与 4/8 开头代码的标记。
+    """
+    columns = MARKET_COLUMNS[market]
+    if df_raw.empty or '代码' not in df_raw.columns:
+        df = pd.DataFrame(columns=['名称', *columns.values()], index=pd.Index([], dtype=object, name='代码'))
+    else:
+        df = df_raw.reindex(columns=['代码', '名称', *columns]).rename(columns=columns)
+        df['代码'] = df['代码'].astype(str)
+        df = df.drop_duplicates(subset='代码').set_index('代码')
+    for col in columns.values():
+        # ±inf 与缺失值同样处理 (旧版依赖全局选项 mode.use_inf_as_na，新版 pandas 已弃用该选项)
+        df[col] = pd.to_numeric(df[col], errors='coerce').replace([np.inf, -np.inf], np.nan)
+    for col in UNIT_100M_COLUMNS:
+        if col in df.columns: df[col] = df[col] / 100_000_000
+    if market == 'stock':
+        df['IsSTOrDelisted'] = df['名称'].astype(str).str.contains('ST|退') & df['名称'].notna()
+        df['IsPrefix4or8'] = df.index.str.startswith(('4', '8')) if len(df) else pd.Series(dtype=bool)
+    return df
+
+# --- 报表处理函数 (输入均为 normalize_market_frame 的结果) ---
+STOCK_FIELDS = ['Price', 'Percent', 'Amount', 'PE_TTM', 'PB', 'TotalMarketCap']
+
+# 全市场报表中的排行榜: 字段名模板 -> (排序列, 是否升序)。{k} 为榜单长度。
+TOP_K = 20
+REPORT_RANKINGS = {
+    'top_up_{k}': ('Percent', False),
+    'top_down_{k}': ('Percent', True),
+    'top_amount_{k}': ('Amount', False),
+}
+
+def bjt_now():
+    """北京时间的当前时刻字符串。每次运行只取一次，由所有报表共用。"""
+    return datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S')
+
+def select_top_k(df, column, k, ascending=False):
+    """
+    用 np.partition 在 O(n) 内选出按 column 排名前 k 的行，只对边界附近的候选行排序。
+    同值时按 '代码' 升序决定先后，结果与运行环境无关；column 为空值的行不参与排名。
+    """
+    values = df[column].to_numpy(dtype=float)
+    positions = np.flatnonzero(~np.isnan(values))
+    keys = values[positions] if ascending else -values[positions]
+    if len(keys) > k:
+        kth = np.partition(keys, k - 1)[k - 1]
+        candidates = keys <= kth # 包含与第 k 名同值的全部行
+        positions, keys = positions[candidates], keys[candidates]
+    order = np.lexsort((df['代码'].to_numpy()[positions], keys))[:k]
+    return df.iloc[positions[order]]
+
+def rank_sections(df, rankings=REPORT_RANKINGS, k=TOP_K):
+    """一次性生成所有排行榜，返回 {字段名: 记录列表}。"""
+    return {name.format(k=k): select_top_k(df, column, k, ascending).to_dict('records') for name, (column, ascending) in rankings.items()}
+
+def build_top_report(df, trade_date, update_time=None, k=TOP_K):
     if df.empty: return {"error": "No valid data."}
-    df_top_up = df.sort_values(by='Percent', ascending=False).head(20); df_top_down = df.sort_values(by='Percent', ascending=True).head(20)
-    report = {"update_time_bjt": datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), "trade_date": trade_date, "top_up_20": df_top_up.to_dict('records'), "top_down_20": df_top_down.to_dict('records')}
+    report = {"update_time_bjt": update_time or bjt_now(), "trade_date": trade_date}
+    report.update(rank_sections(df, k=k))
     return report
 
-def process_stock_report(df_raw, trade_date):
-    # ... (代码不变)
+def process_etf_report(df_etf, trade_date, update_time=None, k=TOP_K):
+    print("--- (1/x) Processing ETF Data ---")
+    df = df_etf[['名称', 'Price', 'Percent', 'Amount']].dropna().reset_index()
+    df['Amount'] = df['Amount'].round(2); df['Price'] = df['Price'].round(3); df['Percent'] = df['Percent'].round(2)
+    return build_top_report(df, trade_date, update_time, k)
+
+def process_stock_report(df_stock, trade_date, update_time=None, k=TOP_K):
     print("\n--- (2/x) Processing All A-Share Stock Data ---")
-    df_filtered = df_raw[~df_raw['代码'].str.startswith(('4', '8')) & ~df_raw['名称'].str.contains('ST|退')].copy()
-    required_columns = ['代码', '名称', '最新价', '涨跌幅', '成交额', '市盈率-动态', '市净率', '总市值']
-    df = df_filtered[required_columns].copy(); df.rename(columns={'最新价': 'Price', '涨跌幅': 'Percent', '成交额': 'Amount', '市盈率-动态': 'PE_TTM', '市净率': 'PB', '总市值': 'TotalMarketCap'}, inplace=True)
-    for col in ['Price', 'Percent', 'Amount', 'PE_TTM', 'PB', 'TotalMarketCap']: df[col] = pd.to_numeric(df[col], errors='coerce')
-    df.dropna(inplace=True); df['Amount'] = (df['Amount'] / 100_000_000).round(2); df['TotalMarketCap'] = (df['TotalMarketCap'] / 100_000_000).round(2); df['Price'] = df['Price'].round(2); df['Percent'] = df['Percent'].round(2)
-    if df.empty: return {"error": "No valid data."}
-    df_top_up = df.sort_values(by='Percent', ascending=False).head(20); df_top_down = df.sort_values(by='Percent', ascending=True).head(20)
-    report = {"update_time_bjt": datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), "trade_date": trade_date, "top_up_20": df_top_up.to_dict('records'), "top_down_20": df_top_down.to_dict('records')}
-    return report
+    df_filtered = df_stock[~df_stock['IsPrefix4or8'] & ~df_stock['IsSTOrDelisted']]
+    df = df_filtered[['名称', *STOCK_FIELDS]].dropna().reset_index()
+    df['Amount'] = df['Amount'].round(2); df['TotalMarketCap'] = df['TotalMarketCap'].round(2); df['Price'] = df['Price'].round(2); df['Percent'] = df['Percent'].round(2)
+    return build_top_report(df, trade_date, update_time, k)
 
-def process_hk_stock_report(df_raw, trade_date):
-    # ... (代码不变)
+def process_hk_stock_report(df_hk_stock, trade_date, update_time=None, k=TOP_K):
     print("\n--- (3/x) Processing All Hong Kong Stock Data ---")
-    required_columns = ['代码', '名称', '最新价', '涨跌幅', '成交额']; df = df_raw[required_columns].copy()
-    df.rename(columns={'最新价': 'Price', '涨跌幅': 'Percent', '成交额': 'Amount'}, inplace=True)
-    for col in ['Price', 'Percent', 'Amount']: df[col] = pd.to_numeric(df[col], errors='coerce')
-    df.dropna(inplace=True); df['Amount'] = (df['Amount'] / 100_000_000).round(2); df['Price'] = df['Price'].round(3); df['Percent'] = df['Percent'].round(2)
-    if df.empty: return {"error": "No valid data."}
-    df_top_up = df.sort_values(by='Percent', ascending=False).head(20); df_top_down = df.sort_values(by='Percent', ascending=True).head(20)
-    report = {"update_time_bjt": datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), "trade_date": trade_date, "top_up_20": df_top_up.to_dict('records'), "top_down_20": df_top_down.to_dict('records')}
-    return report
+    df = df_hk_stock[['名称', 'Price', 'Percent', 'Amount']].dropna().reset_index()
+    df['Amount'] = df['Amount'].round(2); df['Price'] = df['Price'].round(3); df['Percent'] = df['Percent'].round(2)
+    return build_top_report(df, trade_date, update_time, k)
 
-def process_stock_watchlist_report(df_raw, trade_date, watchlist_codes):
-    # ... (代码不变)
+def select_codes(df, codes):
+    """
+    按给定代码顺序从标准行情表中选出存在的行 (保留重复代码与顺序，跳过不存在的代码)。
+    """
+    codes = pd.Index([str(code) for code in codes], name='代码')
+    return df.reindex(codes[codes.isin(df.index)])
+
+def frame_to_records(df, update_time, trade_date, null_columns=()):
+    """
+    将报表行 (以 '代码' 为索引) 批量转换为 JSON 记录，并附加时间字段；null_columns 中的 NaN 统一转为 None。
+    """
+    df = df.reset_index()
+    df['update_time_bjt'] = update_time
+    df['trade_date'] = trade_date
+    for col in null_columns:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df.to_dict('records')
+
+def process_stock_watchlist_report(df_stock, trade_date, watchlist_codes, update_time=None):
     print("\n--- (4/x) Processing A-Share Watchlist Data ---")
     if not watchlist_codes: return {"error": "Watchlist is empty, skipping."}
-    df_raw['代码'] = df_raw['代码'].astype(str); live_data_map = df_raw.set_index('代码').to_dict('index'); result_list = []
-    for code in watchlist_codes:
-        if code in live_data_map:
-            item = live_data_map[code]
-            stock_info = {'代码': code, '名称': item.get('名称'), 'Price': round(pd.to_numeric(item.get('最新价'), errors='coerce'), 2), 'Percent': round(pd.to_numeric(item.get('涨跌幅'), errors='coerce'), 2), 'Amount': round(pd.to_numeric(item.get('成交额'), errors='coerce') / 100_000_000, 2), 'PE_TTM': round(pd.to_numeric(item.get('市盈率-动态'), errors='coerce'), 2), 'PB': round(pd.to_numeric(item.get('市净率'), errors='coerce'), 2), 'TotalMarketCap': round(pd.to_numeric(item.get('总市值'), errors='coerce') / 100_000_000, 2), "update_time_bjt": datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), "trade_date": trade_date}
-            result_list.append(stock_info)
+    df = select_codes(df_stock, watchlist_codes)[['名称', *STOCK_FIELDS]].round(2)
+    result_list = frame_to_records(df, update_time or bjt_now(), trade_date)
     print(f"Processed {len(result_list)} stocks from the A-Share watchlist."); return result_list
 
-def process_hk_stock_watchlist_report(df_raw, trade_date, watchlist_codes):
-    # ... (代码不变)
+def process_hk_stock_watchlist_report(df_hk_stock, trade_date, watchlist_codes, update_time=None):
     print("\n--- (5/x) Processing Hong Kong Stock Watchlist Data ---")
     if not watchlist_codes: return {"error": "Watchlist is empty, skipping."}
-    df_raw['代码'] = df_raw['代码'].astype(str); live_data_map = df_raw.set_index('代码').to_dict('index'); result_list = []
-    for code in watchlist_codes:
-        if code in live_data_map:
-            item = live_data_map[code]
-            stock_info = {'代码': code, '名称': item.get('名称'), 'Price': round(pd.to_numeric(item.get('最新价'), errors='coerce'), 3), 'Percent': round(pd.to_numeric(item.get('涨跌幅'), errors='coerce'), 2), 'Amount': round(pd.to_numeric(item.get('成交额'), errors='coerce') / 100_000_000, 2), "update_time_bjt": datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), "trade_date": trade_date}
-            result_list.append(stock_info)
+    df = select_codes(df_hk_stock, watchlist_codes)[['名称', 'Price', 'Percent', 'Amount']].round({'Price': 3, 'Percent': 2, 'Amount': 2})
+    result_list = frame_to_records(df, update_time or bjt_now(), trade_date)
     print(f"Processed {len(result_list)} stocks from the HK Stock watchlist."); return result_list
     
-def process_observe_list_report(df_stock_raw, df_etf_raw, df_hk_stock_raw, trade_date, observe_list_codes):
-    # ... (代码不变)
+def process_observe_list_report(df_stock, df_etf, df_hk_stock, trade_date, observe_list_codes, update_time=None):
     print("\n--- Processing Unified Observe List (A-Share, HK-Stock, ETF) ---")
     
     if not observe_list_codes:
         print("Observe list is empty, skipping.")
         return {"error": "Observe list is empty, skipping."}
 
-    stock_data_map = {}
-    if not df_stock_raw.empty:
-        df_stock_raw['代码'] = df_stock_raw['代码'].astype(str)
-        stock_data_map = df_stock_raw.set_index('代码').to_dict('index')
+    # 查找优先级: A股 -> 港股 -> ETF；港股与 ETF 价格保留 3 位小数，且没有估值字段
+    lookup_order = [(df_stock, 2), (df_hk_stock, 3), (df_etf, 3)]
+    codes = pd.Index([str(code) for code in observe_list_codes], name='代码')
+    resolved = np.zeros(len(codes), dtype=bool)
+    parts = []
+    for df, price_digits in lookup_order:
+        take = codes.isin(df.index) & ~resolved
+        resolved |= take
+        if not take.any(): continue
+        part = df.reindex(codes[take]).reindex(columns=['名称', *STOCK_FIELDS])
+        part['Price'] = part['Price'].round(price_digits)
+        part['_pos'] = np.flatnonzero(take)
+        parts.append(part)
 
-    etf_data_map = {}
-    if not df_etf_raw.empty:
-        df_etf_raw['代码'] = df_etf_raw['代码'].astype(str)
-        etf_data_map = df_etf_raw.set_index('代码').to_dict('index')
-
-    hk_stock_data_map = {}
-    if not df_hk_stock_raw.empty:
-        df_hk_stock_raw['代码'] = df_hk_stock_raw['代码'].astype(str)
-        hk_stock_data_map = df_hk_stock_raw.set_index('代码').to_dict('index')
+    for code in codes[~resolved]:
+        print(f"  - Warning: Code {code} from observe list not found in any dataset.")
 
     result_list = []
-    
-    def safe_round(value, digits, divisor=1):
-        numeric_val = pd.to_numeric(value, errors='coerce')
-        if pd.isna(numeric_val): return None
-        return round(numeric_val / divisor, digits)
-
-    for code in observe_list_codes:
-        item, security_type = None, None
-        if code in stock_data_map: item, security_type = stock_data_map[code], 'stock'
-        elif code in hk_stock_data_map: item, security_type = hk_stock_data_map[code], 'hk_stock'
-        elif code in etf_data_map: item, security_type = etf_data_map[code], 'etf'
-        
-        if not item:
-            print(f"  - Warning: Code {code} from observe list not found in any dataset.")
-            continue
-        
-        common_info = {
-            "update_time_bjt": datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d %H:%M:%S'), 
-            "trade_date": trade_date
-        }
-
-        if security_type == 'stock':
-            security_info = {'代码': code, '名称': item.get('名称'), 'Price': safe_round(item.get('最新价'), 2), 'Percent': safe_round(item.get('涨跌幅'), 2), 'Amount': safe_round(item.get('成交额'), 2, 100_000_000), 'PE_TTM': safe_round(item.get('市盈率-动态'), 2), 'PB': safe_round(item.get('市净率'), 2), 'TotalMarketCap': safe_round(item.get('总市值'), 2, 100_000_000)}
-        elif security_type == 'hk_stock':
-            security_info = {'代码': code, '名称': item.get('名称'), 'Price': safe_round(item.get('最新价'), 3), 'Percent': safe_round(item.get('涨跌幅'), 2), 'Amount': safe_round(item.get('成交额'), 2, 100_000_000), 'PE_TTM': None, 'PB': None, 'TotalMarketCap': None}
-        elif security_type == 'etf':
-            security_info = {'代码': code, '名称': item.get('名称'), 'Price': safe_round(item.get('最新价'), 3), 'Percent': safe_round(item.get('涨跌幅'), 2), 'Amount': safe_round(item.get('成交额'), 2, 100_000_000), 'PE_TTM': None, 'PB': None, 'TotalMarketCap': None}
-            
-        security_info.update(common_info)
-        result_list.append(security_info)
+    if parts:
+        df = pd.concat(parts).sort_values('_pos', kind='stable').drop(columns='_pos')
+        df[STOCK_FIELDS[1:]] = df[STOCK_FIELDS[1:]].round(2)
+        result_list = frame_to_records(df, update_time or bjt_now(), trade_date, null_columns=STOCK_FIELDS)
         
     print(f"Processed {len(result_list)} securities from the list provided.")
-    if not result_list and not stock_data_map and not hk_stock_data_map and not etf_data_map:
+    if not result_list and df_stock.empty and df_hk_stock.empty and df_etf.empty:
         return {"error": "All underlying data sources failed to fetch data."}
         
     return result_list
     
-def process_dynamic_a_share_report(df_stock_raw, trade_date, dynamic_codes, flow_info_map):
-    # ... (代码不变)
+# 动态列表从 flow info 中补充的字段
+A_SHARE_FLOW_FIELDS = ['PotScore', '总净流入占比_5日总和', '主力净流入-净占比', 'l2name', 'Price20-day-MA_IsUp']
+HK_SHARE_FLOW_FIELDS = ['GGT']
+
+def enrich_with_flow_info(results, flow_info, fields):
+    """按 '代码' 为报表记录批量补充 flow info 字段，缺失的代码或字段补 None。"""
+    flow = flow_info.lookup([item['代码'] for item in results], fields)
+    flow = flow[~flow.index.duplicated()].reindex([item['代码'] for item in results])
+    flow = flow.astype(object).where(flow.notna(), None)
+    for item, extra in zip(results, flow.to_dict('records')):
+        item.update(extra)
+    return results
+
+def process_dynamic_a_share_report(df_stock, trade_date, dynamic_codes, flow_info, update_time=None):
     """
-    处理动态传入的A股列表，并从 flow_info_map 中补充额外字段。
+    处理动态传入的A股列表，并从 flow_info 中补充额外字段。
     """
     print("\n--- (NEW DYNAMIC TASK) Processing Dynamic A-Share List with Flow Info ---")
     if not dynamic_codes:
         return {"error": "Dynamic A-share list is empty."}
     
-    base_results = process_observe_list_report(df_stock_raw, pd.DataFrame(), pd.DataFrame(), trade_date, dynamic_codes)
+    base_results = process_observe_list_report(df_stock, normalize_market_frame(pd.DataFrame(), 'etf'), normalize_market_frame(pd.DataFrame(), 'hk_stock'), trade_date, dynamic_codes, update_time)
     
     if "error" in base_results or not base_results:
         return base_results
 
-    extra_fields = ['PotScore', '总净流入占比_5日总和', '主力净流入-净占比', 'l2name', 'Price20-day-MA_IsUp']
-    
-    enriched_results = []
-    for stock_item in base_results:
-        code = stock_item['代码']
-        flow_data = flow_info_map.get(code, {})
-        
-        for field in extra_fields:
-            stock_item[field] = flow_data.get(field)
-            
-        enriched_results.append(stock_item)
-        
+    enriched_results = enrich_with_flow_info(base_results, flow_info, A_SHARE_FLOW_FIELDS)
     print(f"Enriched {len(enriched_results)} stocks with flow information.")
     return enriched_results
 
-# --- 脚本执行入口 (保持不变) ---
+def process_dynamic_hk_share_report(df_hk_stock, trade_date, dynamic_codes, hk_flow_info, update_time=None):
+    """
+    处理动态传入的港股列表，并从 hk_flow_info 中补充港股通标记等字段。
+    """
+    print("\n--- (NEW DYNAMIC TASK) Processing Dynamic HK-Share List with Flow Info ---")
+    if not dynamic_codes:
+        return {"error": "Dynamic HK-share list is empty."}
+
+    base_results = process_observe_list_report(normalize_market_frame(pd.DataFrame(), 'stock'), normalize_market_frame(pd.DataFrame(), 'etf'), df_hk_stock, trade_date, dynamic_codes, update_time)
+
+    if "error" in base_results or not base_results:
+        return base_results
+
+    enriched_results = enrich_with_flow_info(base_results, hk_flow_info, HK_SHARE_FLOW_FIELDS)
+    print(f"Enriched {len(enriched_results)} HK stocks with flow information.")
+    return enriched_results
+
+# --- 行业聚合 (按 flow info 中的申万二级行业 l2name) ---
+SECTOR_FILE = "sector_data.json"
+SECTOR_FLOW_FIELDS = ['l2name', 'PotScore', 'Price20-day-MA_IsUp']
+
+def process_sector_report(df_stock, trade_date, flow_info, update_time=None):
+    """
+    全市场A股按行业聚合: 一次 join 补充 flow info 字段，一次 groupby 计算各行业的成交额加权涨跌幅、成交额合计、
+    上涨/下跌家数、PotScore 均值与站上 20 日均线的比例。没有行业信息的代码不参与聚合；按成交额合计降序输出。
+    """
+    print("\n--- Processing A-Share Sector Aggregation ---")
+    if df_stock.empty: return {"error": "No valid data."}
+    flow = flow_info.lookup(df_stock.index, SECTOR_FLOW_FIELDS)
+    df = df_stock[['Percent', 'Amount']].join(flow[~flow.index.duplicated()], how='inner')
+    df = df[df['l2name'].notna() & (df['l2name'] != '')]
+    if df.empty: return {"error": "No sector information in flow info."}
+
+    # 加权涨跌幅只使用涨跌幅与成交额都有效的行；停牌等缺失涨跌幅的行不计入涨跌家数
+    percent, amount = df['Percent'].to_numpy(dtype=float), df['Amount'].to_numpy(dtype=float)
+    weighted = ~np.isnan(percent) & ~np.isnan(amount)
+    parts = pd.DataFrame({
+        'l2name': df['l2name'].to_numpy(),
+        'Count': 1,
+        'Amount': amount,
+        '_weighted_amount': np.where(weighted, amount, 0.0),
+        '_weighted_percent': np.where(weighted, percent * amount, 0.0),
+        'Up': percent > 0,
+        'Down': percent < 0,
+        'PotScore': pd.to_numeric(df['PotScore'], errors='coerce').to_numpy(dtype=float),
+        'AboveMA20': df['Price20-day-MA_IsUp'].map({True: 1.0, False: 0.0}).to_numpy(dtype=float),
+    })
+    # 同一个分组对象上一次 sum 与一次 mean (分组只计算一次)，比逐列的 named aggregation 快数倍
+    by_sector = parts.groupby('l2name', sort=False)
+    grouped = by_sector[['Count', 'Amount', '_weighted_amount', '_weighted_percent', 'Up', 'Down']].sum()
+    grouped[['PotScore', 'AboveMA20']] = by_sector[['PotScore', 'AboveMA20']].mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grouped['Percent'] = grouped['_weighted_percent'] / grouped['_weighted_amount']
+    grouped['AboveMA20'] = grouped['AboveMA20'] * 100
+    grouped = grouped.reset_index().sort_values(['Amount', 'l2name'], ascending=[False, True], kind='stable')
+    df = grouped[['l2name', 'Count', 'Percent', 'Amount', 'Up', 'Down', 'PotScore', 'AboveMA20']].round({'Percent': 2, 'Amount': 2, 'PotScore': 4, 'AboveMA20': 1})
+    df[['Count', 'Up', 'Down']] = df[['Count', 'Up', 'Down']].astype(int)
+    for col in ('Percent', 'PotScore', 'AboveMA20'):
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    report = {"update_time_bjt": update_time or bjt_now(), "trade_date": trade_date, "sectors": df.to_dict('records')}
+    print(f"Aggregated {len(parts)} stocks into {len(df)} sectors."); return report
+
+# --- 滚动 N 日热度排行 (状态见 _hotrank.RollingWindow，每个交易日更新一次) ---
+HOT_RANK_FILES = {'stock': "ARHot{n}days_rolling_top{k}.json", 'hk_stock': "HKHot{n}days_rolling_top{k}.json"}
+HOT_RANK_INFLOW_FIELD = '主力净流入-净占比'
+
+def flow_inflow_ratio(flow_info, codes, trade_date):
+    """flow info 中各代码 trade_date 当天的主力净流入占比 (%)；日期不是 trade_date 的记录视为缺失。"""
+    flow = flow_info.lookup(list(codes), ['日期', HOT_RANK_INFLOW_FIELD])
+    flow = flow[~flow.index.duplicated()].reindex(codes)
+    inflow = pd.to_numeric(flow[HOT_RANK_INFLOW_FIELD], errors='coerce')
+    return inflow.where(flow['日期'] == trade_date)
+
+def process_hot_rank_report(state, df_market, trade_date, update_time=None, k=TOP_K, weights=None, min_days=1):
+    """
+    由滚动窗口的聚合结果生成热度排行前 k 名。只对当天仍在交易的代码排名，A股排除 ST/退市与 4/8 开头的代码。
+    """
+    print(f"\n--- Processing Rolling {state.window}-Day Hot Ranking ---")
+    if not len(state): return {"error": "Hot rank history is empty."}
+    agg = state.aggregates()
+    agg = agg[agg.index.isin(df_market.index)]
+    if 'IsSTOrDelisted' in df_market.columns:
+        flags = df_market.reindex(agg.index)
+        agg = agg[~flags['IsSTOrDelisted'].astype(bool) & ~flags['IsPrefix4or8'].astype(bool)]
+    # 窗口尚未填满时 (例如刚开始积累状态)，按已有的交易日数放宽最少天数要求
+    agg = agg.assign(Score=score_aggregates(agg, weights, min(min_days, len(state.trade_dates()))))
+    top = select_top_k(agg.reset_index(), 'Score', k).set_index('代码')
+    top = top.join(df_market[['Price', 'Percent']])
+    df = top[['名称', 'Score', 'Return', 'Amount', 'Inflow', 'Days', 'Price', 'Percent']].round({'Score': 4, 'Return': 2, 'Amount': 2, 'Inflow': 2, 'Price': 3, 'Percent': 2})
+    result_list = frame_to_records(df, update_time or bjt_now(), trade_date, null_columns=['Return', 'Amount', 'Inflow', 'Price', 'Percent'])
+    print(f"Ranked {len(agg)} codes over {len(state.trade_dates())} trading days."); return result_list
+
+# --- 脚本执行入口 ---
 if __name__ == "__main__":
-    # ... (代码不变)
     output_dir = "data"
     os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(output_dir)
+    # 输出格式 (pretty / minified / columnar) 与预压缩副本 (逗号分隔: gz,br)，默认与旧版输出一致
+    output_format, output_sidecars = resolve_output_options(os.environ.get('OUTPUT_FORMAT'), os.environ.get('OUTPUT_SIDECARS', '').split(','))
+    # 增量补丁目录 (相对于 output_dir，DELTA_DIR 为空字符串时不生成补丁)
+    delta_dir = os.environ.get('DELTA_DIR', DEFAULT_DELTA_DIR)
+    delta_dir = os.path.join(output_dir, delta_dir) if delta_dir else None
+    # 运行指标 (METRICS_DIR 为空字符串时不写出)；PROFILE=1 时为每个报表计算任务生成 cProfile 文件
+    metrics_dir = os.environ.get('METRICS_DIR', DEFAULT_METRICS_DIR)
+    metrics = RunMetrics(profile_dir=metrics_dir if metrics_dir and os.environ.get('PROFILE') else None)
 
-    def run_and_save_task(name, func, file, *args):
-        output_filepath = os.path.join(output_dir, file)
-        final_data = {}
+    # 报表任务调度：计算与 JSON 编码/写盘拆成两个有依赖的任务，某个报表在写盘时其它报表可以继续计算
+    task_workers = int(os.environ.get('TASK_WORKERS', DEFAULT_MAX_WORKERS))
+    if metrics.profile_dir and task_workers > 1:
+        # Python 3.12 起同一进程只能有一个活动的 cProfile，分析时串行执行全部任务
+        print(f"PROFILE is set: running report tasks on 1 worker instead of {task_workers}.")
+        task_workers = 1
+    scheduler = TaskScheduler(max_workers=task_workers)
+
+    def run_report_task(name, func, *args):
         print(f"\n[{name}] -> Starting...")
-        try:
-            pd.set_option('mode.use_inf_as_na', True)
-            result = func(*args)
-            final_data = result
-        except Exception as e:
-            print(f"[{name}] -> Error: {e}")
-            import traceback
-            traceback.print_exc()
-            final_data = {"error": str(e)}
-        with open(output_filepath, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, ensure_ascii=False, indent=4)
-        print(f"[{name}] -> Finished. Data saved to {output_filepath}")
-
-    print("--- Starting Data Acquisition Phase ---")
-    base_trade_date = datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
-    df_etf_raw, df_stock_raw, df_hk_stock_raw = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-    try:
-        df_etf_raw = ak.fund_etf_spot_em()
-        print(f"Successfully fetched {len(df_etf_raw)} ETFs.")
-        if not df_etf_raw.empty and '数据日期' in df_etf_raw.columns and pd.to_datetime(df_etf_raw['数据日期'].iloc[0], errors='coerce') is not pd.NaT:
-            ts = pd.to_datetime(df_etf_raw['数据日期'].iloc[0])
-            base_trade_date = ts.strftime('%Y-%m-%d')
-            print(f"Base trade date set to: {base_trade_date}")
-    except Exception as e: print(f"Could not fetch ETF data or extract date: {e}. Using fallback date.")
-    try:
-        df_stock_raw = ak.stock_zh_a_spot_em()
-        print(f"Successfully fetched {len(df_stock_raw)} A-share stocks.")
-    except Exception as e: print(f"Could not fetch A-share stock data: {e}")
-    try:
-        df_hk_stock_raw = ak.stock_hk_main_board_spot_em()
-        print(f"Successfully fetched {len(df_hk_stock_raw)} HK stocks.")
-    except Exception as e: print(f"Could not fetch HK stock data: {e}")
+        with metrics.span('process', name) as span:
+            try:
+                with metrics.profile(name):
+                    result = func(*args)
+                span['rows'] = count_rows(result)
+                return result
+            except Exception as e:
+                print(f"[{name}] -> Error: {e}")
+                import traceback
+                traceback.print_exc()
+                span['error'] = str(e)
+                return {"error": str(e)}
 
-    print("\n--- Reading Local Files & Dynamic Inputs ---")
+    def save_report_task(name, file, final_data, output_format=output_format, sidecars=output_sidecars):
+        output_filepath = os.path.join(output_dir, file)
+        # 内容 (不含时间戳) 未变化时不重写文件，避免每 15 分钟产生无意义的提交
+        with metrics.span('save', name, file=file) as span:
+            span['changed'] = publish_json(output_dir, file, final_data, manifest, run_time_bjt, output_format, sidecars, stats=span, delta_dir=delta_dir)
+        if span['changed']:
+            print(f"[{name}] -> Finished. Data saved to {output_filepath}")
+        else:
+            print(f"[{name}] -> Finished. Content unchanged, kept {output_filepath}")
+
+    def add_report_task(name, func, file, *args):
+        report = scheduler.add(name, run_report_task, name, func, *args)
+        scheduler.add(f"{name} (save)", save_report_task, name, file, TaskRef(report))
+
+    print("--- Reading Local Files & Dynamic Inputs ---")
     
-    flow_info_map = read_flow_info_base(os.path.join(output_dir, "FlowInfoBase.json"))
+    with metrics.span('read', 'flow_info'):
+        flow_info = read_flow_info_base(os.path.join(output_dir, "FlowInfoBase.json"))
+        hk_flow_info = read_flow_info_base(os.path.join(output_dir, "HKFlowInfoBase.json"))
+
+    # 滚动热度排行的配置 (HOT_RANK_DIR 为空字符串时关闭)；HOT_WATCHLIST=rolling 时热度观察列表改用本项目维护的排行
+    hot_rank_dir = os.environ.get('HOT_RANK_DIR', DEFAULT_HOT_RANK_DIR)
+    hot_rank_window = int(os.environ.get('HOT_RANK_WINDOW', DEFAULT_WINDOW))
+    hot_rank_min_days = int(os.environ.get('HOT_RANK_MIN_DAYS', max(1, hot_rank_window // 2)))
+    hot_rank_files = {market: file.format(n=hot_rank_window, k=TOP_K) for market, file in HOT_RANK_FILES.items()}
+    if os.environ.get('HOT_WATCHLIST') == 'rolling':
+        a_share_hot_file, hk_share_hot_file = hot_rank_files['stock'], hot_rank_files['hk_stock']
+    else:
+        a_share_hot_file, hk_share_hot_file = "ARHot10days_top20.json", "HKHot10days_top20.json"
 
-    a_share_watchlist = read_watchlist_from_json(os.path.join(output_dir, "ARHot10days_top20.json"))
-    hk_share_watchlist = read_watchlist_from_json(os.path.join(output_dir, "HKHot10days_top20.json"))
-    observe_list = read_watchlist_from_json(os.path.join(output_dir, "AIPEObserve.json"))
+    with metrics.span('read', 'watchlists'):
+        a_share_watchlist = read_watchlist_from_json(os.path.join(output_dir, a_share_hot_file))
+        hk_share_watchlist = read_watchlist_from_json(os.path.join(output_dir, hk_share_hot_file))
+        observe_list = read_watchlist_from_json(os.path.join(output_dir, "AIPEObserve.json"))
 
     dynamic_a_list, dynamic_hk_list = [], []
     dynamic_a_list_str = os.environ.get('INPUT_DYNAMICLIST')
@@ -266,41 +430,158 @@ if __name__ == "__main__":
         except json.JSONDecodeError:
             print(f"Error: Could not parse dynamic HK-share list input: '{dynamic_hk_list_str}'.")
 
+    print("\n--- Starting Data Acquisition Phase ---")
+    # REPLAY_DIR: 回放录制的原始快照 (不访问网络、不导入 akshare)；RECORD_DIR: 把本次拉取的原始快照录制下来
+    replay_dir, record_dir = os.environ.get('REPLAY_DIR'), os.environ.get('RECORD_DIR')
+    fetchers, recording = replay_fetchers(replay_dir) if replay_dir else (default_fetchers(), None)
+    quote_source = FrameQuoteSource({market: fetcher.frame for market, fetcher in fetchers.items()}) if recording else EastmoneyQuoteSource()
+    # 获取策略 (FETCH_MODE: auto / full / targeted)。auto 时定时运行下载全市场快照；
+    # 带动态列表的按需运行不需要全市场排行榜，只按代码获取各列表中的行情
+    fetch_mode = os.environ.get('FETCH_MODE') or 'auto'
+    if fetch_mode not in FETCH_MODES:
+        print(f"Warning: Unknown FETCH_MODE '{fetch_mode}'. Using 'auto'.")
+        fetch_mode = 'auto'
+    plan = plan_fetch(
+        group_codes(a_share_watchlist, hk_share_watchlist, observe_list, dynamic_a_list, dynamic_hk_list),
+        mode=fetch_mode,
+        full_reports_due=not (dynamic_a_list or dynamic_hk_list),
+    )
+    print(plan)
+    # GitHub Actions 中把获取策略写入步骤输出：工作流只在全市场运行后保存快照历史与热度排行的缓存
+    if os.environ.get('GITHUB_OUTPUT'):
+        with open(os.environ['GITHUB_OUTPUT'], 'a', encoding='utf-8') as f:
+            f.write(f"full_market={'true' if plan.full_market else 'false'}\n")
+    # 各数据源并发拉取，单个数据源失败时返回空 DataFrame，不影响其它数据源
+    snapshots = fetch_planned_snapshots(plan, fetchers, quote_source, metrics=metrics)
+    df_etf_raw, df_stock_raw, df_hk_stock_raw = snapshots['etf'], snapshots['stock'], snapshots['hk_stock']
+    if recording:
+        base_trade_date = recording['trade_date']
+    else:
+        # 全市场快照的交易日取自 ETF 的 '数据日期'；按代码获取时任一市场的行情都带有该列
+        dated_raw = next((df for df in (df_etf_raw, df_stock_raw, df_hk_stock_raw) if '数据日期' in df.columns), df_etf_raw)
+        base_trade_date = resolve_trade_date(dated_raw, fallback=datetime.now(timezone(timedelta(hours=8))).strftime('%Y-%m-%d'))
+
+    # 本次运行的统一更新时间 (即快照时间)，所有报表、记录与历史快照共用；回放时沿用录制时的时间，输出逐字节可复现
+    run_time_bjt = recording['snapshot_time'] if recording else bjt_now()
+
+    # 只录制全市场快照；按代码获取的部分行情回放后无法生成全市场报表
+    if record_dir and not plan.full_market:
+        print("Targeted fetch: raw snapshots are not recorded.")
+    elif record_dir:
+        try:
+            with metrics.span('record', record_dir):
+                record_snapshots(record_dir, snapshots, base_trade_date, run_time_bjt)
+        except Exception as e:
+            print(f"Could not record snapshots to {record_dir}: {e}")
+
+    print("\n--- Normalizing Market Data ---")
+    # 每个市场只标准化一次，之后所有报表都从标准行情表中选取数据；原始快照随即释放
+    with metrics.span('normalize', 'etf', rows=len(df_etf_raw)):
+        df_etf = normalize_market_frame(df_etf_raw, 'etf')
+    with metrics.span('normalize', 'stock', rows=len(df_stock_raw)):
+        df_stock = normalize_market_frame(df_stock_raw, 'stock')
+    with metrics.span('normalize', 'hk_stock', rows=len(df_hk_stock_raw)):
+        df_hk_stock = normalize_market_frame(df_hk_stock_raw, 'hk_stock')
+    del snapshots, df_etf_raw, df_stock_raw, df_hk_stock_raw
+    print(f"Normalized {len(df_etf)} ETFs, {len(df_stock)} A-share stocks and {len(df_hk_stock)} HK stocks.")
+
+    # 盘中快照历史 (HISTORY_DIR 为空字符串时关闭)；只追加全市场快照
+    history_dir = os.environ.get('HISTORY_DIR', DEFAULT_HISTORY_DIR)
+    if history_dir and plan.full_market:
+        print("\n--- Appending Snapshot History ---")
+        try:
+            with metrics.span('history', 'append'):
+                history = HistoryStore(history_dir)
+                for market, df in (('etf', df_etf), ('stock', df_stock), ('hk_stock', df_hk_stock)):
+                    if not df.empty:
+                        print(f"Appended {len(df)} {market} rows to {history.append(market, df, base_trade_date, run_time_bjt)}")
+                removed = history.prune(int(os.environ.get('HISTORY_KEEP_DAYS', DEFAULT_KEEP_DAYS)))
+            if removed: print(f"Pruned {removed} expired history partitions.")
+        except Exception as e:
+            print(f"Could not append snapshot history: {e}")
+
+    hot_ranks = {}
+    if hot_rank_dir and plan.full_market:
+        print("\n--- Updating Rolling Hot Rankings ---")
+        try:
+            hot_rank_weights = parse_weights(os.environ.get('HOT_RANK_WEIGHTS'))
+        except ValueError as e:
+            print(f"Warning: {e}. Using default hot rank weights.")
+            hot_rank_weights = parse_weights(None)
+        for market, df, market_flow_info in (('stock', df_stock, flow_info), ('hk_stock', df_hk_stock, None)):
+            if df.empty: continue
+            try:
+                with metrics.span('hot_rank', market, rows=len(df)):
+                    state_path = os.path.join(hot_rank_dir, f"{market}.npz")
+                    state = RollingWindow.load(state_path, hot_rank_window)
+                    inflow = flow_inflow_ratio(market_flow_info, df.index, base_trade_date) if market_flow_info is not None else None
+                    state.update(base_trade_date, daily_metrics(df, inflow))
+                    removed = state.compact()
+                    state.save(state_path)
+                print(f"Updated {market} hot rank state: {len(state)} codes, {len(state.trade_dates())}/{state.window} days"
+                      + (f", {removed} inactive codes removed." if removed else "."))
+                hot_ranks[market] = state
+            except Exception as e:
+                print(f"Could not update {market} hot rank state: {e}")
+
     print("\n--- Starting Data Processing Phase ---")
     
-    if not df_etf_raw.empty:
-        run_and_save_task("ETF Report", process_etf_report, "etf_data.json", df_etf_raw, base_trade_date)
-    if not df_stock_raw.empty:
-        run_and_save_task("A-Share Report", process_stock_report, "stock_data.json", df_stock_raw, base_trade_date)
-        run_and_save_task("A-Share Watchlist", process_stock_watchlist_report, "stock_10days_data.json", df_stock_raw, base_trade_date, a_share_watchlist)
-    if not df_hk_stock_raw.empty:
-        run_and_save_task("HK Stock Report", process_hk_stock_report, "hk_stock_data.json", df_hk_stock_raw, base_trade_date)
-        run_and_save_task("HK Stock Watchlist", process_hk_stock_watchlist_report, "hk_stock_10days_data.json", df_hk_stock_raw, base_trade_date, hk_share_watchlist)
+    # 全市场排行榜只在下载了全市场快照时生成
+    if not df_etf.empty and plan.full_market:
+        add_report_task("ETF Report", process_etf_report, "etf_data.json", df_etf, base_trade_date, run_time_bjt)
+    if not df_stock.empty and plan.full_market:
+        add_report_task("A-Share Report", process_stock_report, "stock_data.json", df_stock, base_trade_date, run_time_bjt)
+    if not df_stock.empty and plan.full_market:
+        add_report_task("A-Share Sector Report", process_sector_report, SECTOR_FILE, df_stock, base_trade_date, flow_info, run_time_bjt)
+    if not df_stock.empty:
+        add_report_task("A-Share Watchlist", process_stock_watchlist_report, "stock_10days_data.json", df_stock, base_trade_date, a_share_watchlist, run_time_bjt)
+    if not df_hk_stock.empty and plan.full_market:
+        add_report_task("HK Stock Report", process_hk_stock_report, "hk_stock_data.json", df_hk_stock, base_trade_date, run_time_bjt)
+    if not df_hk_stock.empty:
+        add_report_task("HK Stock Watchlist", process_hk_stock_watchlist_report, "hk_stock_10days_data.json", df_hk_stock, base_trade_date, hk_share_watchlist, run_time_bjt)
     
-    if not df_stock_raw.empty or not df_etf_raw.empty or not df_hk_stock_raw.empty:
-        run_and_save_task("Unified Observe List", process_observe_list_report, "stock_observe_data.json", df_stock_raw, df_etf_raw, df_hk_stock_raw, base_trade_date, observe_list)
+    if not df_stock.empty or not df_etf.empty or not df_hk_stock.empty:
+        add_report_task("Unified Observe List", process_observe_list_report, "stock_observe_data.json", df_stock, df_etf, df_hk_stock, base_trade_date, observe_list, run_time_bjt)
         
-    if dynamic_a_list and not df_stock_raw.empty:
-        run_and_save_task(
+    for market, state in hot_ranks.items():
+        df_market = df_stock if market == 'stock' else df_hk_stock
+        add_report_task(f"{'A-Share' if market == 'stock' else 'HK Stock'} Hot Ranking", process_hot_rank_report, hot_rank_files[market],
+                        state, df_market, base_trade_date, run_time_bjt, TOP_K, hot_rank_weights, hot_rank_min_days)
+
+    if dynamic_a_list and not df_stock.empty:
+        add_report_task(
             "Dynamic A-Share List", 
             process_dynamic_a_share_report, 
             "stock_dynamic_data.json", 
-            df_stock_raw, 
+            df_stock, 
             base_trade_date, 
             dynamic_a_list, 
-            flow_info_map
+            flow_info,
+            run_time_bjt
         )
         
-    if dynamic_hk_list and not df_hk_stock_raw.empty:
-        run_and_save_task(
+    if dynamic_hk_list and not df_hk_stock.empty:
+        add_report_task(
             "Dynamic HK-Share List",
-            process_observe_list_report,
+            process_dynamic_hk_share_report,
             "hk_stock_dynamic_data.json",
-            pd.DataFrame(),
-            pd.DataFrame(),
-            df_hk_stock_raw,
+            df_hk_stock,
             base_trade_date,
-            dynamic_hk_list
+            dynamic_hk_list,
+            hk_flow_info,
+            run_time_bjt
         )
 
+    scheduler.run()
+    scheduler.print_summary()
+
+    manifest.save()
+    if metrics_dir:
+        critical_path, critical_seconds = scheduler.critical_path()
+        metrics.info.update({
+            'run_time_bjt': run_time_bjt, 'trade_date': base_trade_date,
+            'output_format': output_format, 'task_workers': scheduler.max_workers,
+            'critical_path': critical_path, 'critical_path_seconds': round(critical_seconds, 4),
+        })
+        metrics.write(metrics_dir)
     print("\nAll tasks finished.")
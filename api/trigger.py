@@ -1,9 +1,207 @@
 # api/trigger.py
 import os
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from http.server import BaseHTTPRequestHandler
 import json
 
+# --- 调度配置 (均可通过环境变量覆盖) ---
+# GitHub API 地址；本地测试时可指向一个替身 HTTP 服务
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+# 合并窗口 (秒)：窗口内到达的请求合并为一次 workflow_dispatch
+COALESCE_WINDOW_SECONDS = float(os.environ.get('TRIGGER_COALESCE_WINDOW', '2'))
+# 一次 workflow 运行的预计时长 (秒)：这段时间内已被覆盖的代码不再重复触发
+INFLIGHT_TTL_SECONDS = float(os.environ.get('TRIGGER_INFLIGHT_TTL', '300'))
+# 令牌桶：每分钟最多补充的 dispatch 次数与可突发的次数
+DISPATCH_RATE_PER_MINUTE = float(os.environ.get('TRIGGER_RATE_PER_MINUTE', '6'))
+DISPATCH_BURST = int(os.environ.get('TRIGGER_BURST', '3'))
+
+
+def create_session():
+    """
+    复用连接的 requests.Session。函数实例在 Vercel 上热启动时会保留，避免每次请求重新建立 TLS 连接。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class TokenBucket:
+    """线程安全的令牌桶，限制发往 GitHub dispatch API 的请求速率。"""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def retry_after(self):
+        """距离下一个令牌可用的秒数。"""
+        with self._lock:
+            return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else float('inf')
+
+
+class _Batch:
+    """合并窗口内收集到的一批请求。"""
+
+    def __init__(self):
+        self.a_codes = {}
+        self.hk_codes = {}
+        self.requests = 0
+        self.result = None
+        self.done = threading.Event()
+
+    def add(self, a_codes, hk_codes):
+        # dict 保持首次出现的顺序并去重
+        self.a_codes.update(dict.fromkeys(a_codes))
+        self.hk_codes.update(dict.fromkeys(hk_codes))
+        self.requests += 1
+
+
+class DispatchCoalescer:
+    """
+    将短时间内的多个触发请求合并为一次 workflow_dispatch：
+    1. 请求的代码已被仍在运行中的 workflow 覆盖时，直接返回 covered，不再触发；
+    2. 否则加入当前批次，由批次中的第一个请求等待 window 秒后合并 (A股、港股代码分别取并集并去重) 并触发一次；
+    3. 实际触发前经过令牌桶限流。
+    不带代码的请求是全量刷新 (生成全市场报表)，只与其它全量刷新请求合并、只被进行中的全量刷新覆盖；
+    带代码的运行只按代码获取行情，不能代替全量刷新。
+    """
+
+    def __init__(self, dispatch, window=COALESCE_WINDOW_SECONDS, inflight_ttl=INFLIGHT_TTL_SECONDS, limiter=None):
+        self.dispatch = dispatch
+        self.window = window
+        self.inflight_ttl = inflight_ttl
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self._batches = {} # {'full' / 'lists': 当前批次}
+        # 进行中的运行各自会写出的输出: {'full': (过期时间, None), 'dynamiclist' / 'dynamicHKlist': (过期时间, 代码集合)}。
+        # 每次运行都会整体覆盖动态列表文件，因此新的运行替换同一输出上更早的记录，而不是与之并存
+        self._inflight = {}
+
+    def _covered(self, a_codes, hk_codes, now):
+        def alive(target):
+            run = self._inflight.get(target)
+            return run if run and run[0] > now else None
+        if not a_codes and not hk_codes:
+            return alive('full') is not None
+        for target, codes in (('dynamiclist', a_codes), ('dynamicHKlist', hk_codes)):
+            run = alive(target)
+            if codes and (run is None or not set(codes) <= run[1]):
+                return False
+        return True
+
+    def submit(self, a_codes, hk_codes):
+        kind = 'lists' if a_codes or hk_codes else 'full'
+        with self._lock:
+            if self._covered(a_codes, hk_codes, time.monotonic()):
+                return {"status": "covered", "merged_requests": 1}
+            batch = self._batches.get(kind)
+            leader = batch is None
+            if leader:
+                batch = self._batches[kind] = _Batch()
+            batch.add(a_codes, hk_codes)
+
+        if not leader:
+            batch.done.wait()
+            return batch.result
+
+        try:
+            time.sleep(self.window)
+            with self._lock:
+                self._batches.pop(kind, None)
+            a_list, hk_list = list(batch.a_codes), list(batch.hk_codes)
+            if self.limiter is not None and not self.limiter.try_acquire():
+                batch.result = {"status": "rate_limited", "retry_after": self.limiter.retry_after()}
+            else:
+                batch.result = self.dispatch(a_list, hk_list)
+                if batch.result.get("status") == "dispatched":
+                    expires = time.monotonic() + self.inflight_ttl
+                    with self._lock:
+                        if kind == 'full':
+                            self._inflight['full'] = (expires, None)
+                        if a_list:
+                            self._inflight['dynamiclist'] = (expires, set(a_list))
+                        if hk_list:
+                            self._inflight['dynamicHKlist'] = (expires, set(hk_list))
+            batch.result["merged_requests"] = batch.requests
+        except Exception as e:
+            batch.result = {"status": "error", "error": str(e), "merged_requests": batch.requests}
+        finally:
+            with self._lock:
+                if self._batches.get(kind) is batch:
+                    del self._batches[kind]
+            batch.done.set()
+        return batch.result
+
+
+def build_workflow_inputs(a_codes, hk_codes):
+    """
+    构建包含动态参数的 inputs。
+    GitHub Actions 的 inputs 只接受字符串，所以我们将列表转换为 JSON 字符串
+    """
+    workflow_inputs = {
+        "trigger_source": "api_call"
+    }
+    if a_codes:
+        workflow_inputs['dynamiclist'] = json.dumps(a_codes)
+    if hk_codes:
+        workflow_inputs['dynamicHKlist'] = json.dumps(hk_codes)
+    return workflow_inputs
+
+
+def dispatch_workflow(a_codes, hk_codes):
+    """
+    调用 GitHub API 触发 workflow。返回描述结果的字典。
+    """
+    token = os.environ.get('GITHUB_TOKEN')
+    repo_owner = os.environ.get('GITHUB_REPO_OWNER')
+    repo_name = os.environ.get('GITHUB_REPO_NAME')
+
+    workflow_file_name = "main.yml"
+    branch = "main"
+    url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/actions/workflows/{workflow_file_name}/dispatches"
+
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "Authorization": f"token {token}"
+    }
+    workflow_inputs = build_workflow_inputs(a_codes, hk_codes)
+    data = {
+        "ref": branch,
+        "inputs": workflow_inputs
+    }
+
+    res = SESSION.post(url, headers=headers, json=data, timeout=15)
+    # GitHub 成功接收请求后会返回 204 No Content
+    if res.status_code == 204:
+        return {"status": "dispatched", "sent_inputs": workflow_inputs}
+    return {"status": "failed", "status_code": res.status_code, "github_response": res.text}
+
+
+# 模块级状态：在同一个函数实例的多次请求之间共享
+SESSION = create_session()
+COALESCER = DispatchCoalescer(
+    dispatch_workflow,
+    limiter=TokenBucket(DISPATCH_RATE_PER_MINUTE / 60, DISPATCH_BURST),
+)
+
+
 class handler(BaseHTTPRequestHandler):
 
     # 定义允许的来源 (Origin)
@@ -14,12 +212,14 @@ class handler(BaseHTTPRequestHandler):
     # 根据您提供的错误信息，您的前端是 'https://digital-era.github.io'
     ALLOWED_ORIGIN = "https://digital-era.github.io"
 
-    def _set_headers(self, status_code=200, content_type='application/json'):
+    def _set_headers(self, status_code=200, content_type='application/json', extra_headers=None):
         """
         设置HTTP响应头部，包括CORS相关头部。
         """
         self.send_response(status_code)
         self.send_header('Content-type', content_type)
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
         
         # --- CORS Headers ---
         # 允许指定来源访问此资源
@@ -76,63 +276,46 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps(response).encode('utf-8'))
                 return
 
-        # --- 调用 GitHub API ---
-        workflow_file_name = "main.yml" 
-        branch = "main"
-        url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/actions/workflows/{workflow_file_name}/dispatches"
-
-        headers = {
-            "Accept": "application/vnd.github.v3+json",
-            "Authorization": f"token {token}"
-        }
-
-        # --- 构建包含动态参数的 inputs ---
-        # 基础 inputs
-        workflow_inputs = {
-            "trigger_source": "api_call"
-        }
-        
-        # 检查并添加 dynamiclist (A股) 和 dynamicHKlist (H股)
-        # GitHub Actions 的 inputs 只接受字符串，所以我们将列表转换为 JSON 字符串
+        # --- 提取动态参数 ---
+        # dynamiclist (A股) 和 dynamicHKlist (H股)，非列表的值忽略
         dynamic_list_a = post_data.get('dynamiclist')
-        if dynamic_list_a and isinstance(dynamic_list_a, list):
-            workflow_inputs['dynamiclist'] = json.dumps(dynamic_list_a)
-
+        dynamic_list_a = [str(code) for code in dynamic_list_a] if dynamic_list_a and isinstance(dynamic_list_a, list) else []
         dynamic_list_hk = post_data.get('dynamicHKlist')
-        if dynamic_list_hk and isinstance(dynamic_list_hk, list):
-            workflow_inputs['dynamicHKlist'] = json.dumps(dynamic_list_hk)
+        dynamic_list_hk = [str(code) for code in dynamic_list_hk] if dynamic_list_hk and isinstance(dynamic_list_hk, list) else []
 
-        data = {
-            "ref": branch,
-            "inputs": workflow_inputs
-        }
-        
-        try:
-            # 发送 POST 请求到 GitHub API
-            res = requests.post(url, headers=headers, json=data)
-
-            # GitHub 成功接收请求后会返回 204 No Content
-            if res.status_code == 204:
-                self._set_headers(202) # 202 Accepted
-                response = {
-                    "message": "Workflow triggered successfully.",
-                    "details": f"Check the 'Actions' tab in your GitHub repository '{repo_owner}/{repo_name}' for progress.",
-                    "sent_inputs": workflow_inputs # 返回发送的参数，便于调试
-                }
-                self.wfile.write(json.dumps(response).encode('utf-8'))
-            else:
-                self._set_headers(res.status_code)
-                response = {
-                    "error": "Failed to trigger GitHub workflow.",
-                    "github_response": res.text # 使用 res.text 获取更详细的错误信息
-                }
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+        # --- 合并、去重、限流后调用 GitHub API ---
+        result = COALESCER.submit(dynamic_list_a, dynamic_list_hk)
+        status = result.get("status")
 
-        except Exception as e:
+        if status == "dispatched":
+            self._set_headers(202) # 202 Accepted
+            response = {
+                "message": "Workflow triggered successfully.",
+                "details": f"Check the 'Actions' tab in your GitHub repository '{repo_owner}/{repo_name}' for progress.",
+                "sent_inputs": result["sent_inputs"], # 返回发送的参数 (可能包含合并进来的其它请求的代码)，便于调试
+                "merged_requests": result["merged_requests"]
+            }
+        elif status == "covered":
+            self._set_headers(202)
+            response = {
+                "message": "Request already covered by an in-flight workflow run. No new run was triggered.",
+                "merged_requests": result["merged_requests"]
+            }
+        elif status == "rate_limited":
+            retry_after = max(1, int(result["retry_after"] + 0.999))
+            self._set_headers(429, extra_headers={'Retry-After': str(retry_after)})
+            response = {"error": f"Too many workflow dispatches. Please retry in {retry_after} seconds."}
+        elif status == "failed":
+            self._set_headers(result["status_code"])
+            response = {
+                "error": "Failed to trigger GitHub workflow.",
+                "github_response": result["github_response"] # 使用 res.text 获取更详细的错误信息
+            }
+        else:
             self._set_headers(500)
-            response = {"error": f"An internal error occurred: {str(e)}"}
-            self.wfile.write(json.dumps(response).encode('utf-8'))
-            
+            response = {"error": f"An internal error occurred: {result.get('error')}"}
+
+        self.wfile.write(json.dumps(response).encode('utf-8'))
         return
 
     def do_GET(self):
@@ -0,0 +1,46 @@
+# benchmarks/_timing.py
+# 基准测试共用的计时工具。导入时把 api/ 加入导入路径 (api 下的模块以同级模块方式互相导入)，
+# 因此各基准脚本应先导入本模块，再导入 index 等模块。
+
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+API_DIR = os.path.join(ROOT, 'api')
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+REPEAT = 20
+
+
+def fastest(func, repeat=REPEAT):
+    """返回 (最快一次的秒数, 最后一次的结果)；函数内的 print 输出被丢弃。"""
+    best, result = float('inf'), None
+    with redirect_stdout(StringIO()):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def best_of(func, repeat=REPEAT):
+    """最快一次的耗时 (毫秒)。"""
+    return fastest(func, repeat)[0] * 1000
+
+
+def measure(func, repeat=REPEAT):
+    """
+    返回 (最快一次的秒数, 峰值内存 MiB, 结果)。计时与 tracemalloc 分开执行，避免 tracemalloc 的开销计入耗时。
+    """
+    best, result = fastest(func, repeat)
+    with redirect_stdout(StringIO()):
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak / (1 << 20), result
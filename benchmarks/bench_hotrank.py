@@ -0,0 +1,68 @@
+# benchmarks/bench_hotrank.py
+# 滚动热度排行的基准测试：用合成行情填满窗口后，测量每日增量更新、整窗重算 (对照)、
+# 打分与选出前 20 名、以及状态文件读写的耗时。
+#
+# 用法:
+#   python benchmarks/bench_hotrank.py                        # 5k 代码，250 日窗口
+#   python benchmarks/bench_hotrank.py --codes 20000 --window 60
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from _timing import best_of
+import index
+from _hotrank import RollingWindow, daily_metrics
+from _synthetic import synthetic_spot_frame
+
+
+def trading_days(count):
+    return [day.strftime('%Y-%m-%d') for day in pd.bdate_range('2025-01-01', periods=count)]
+
+
+def bench(codes, window, extra_days):
+    days = trading_days(window + extra_days)
+    # 合成行情的生成比状态更新慢得多，先生成少量不同的日度指标表循环使用
+    samples = []
+    for seed in range(8):
+        df = index.normalize_market_frame(synthetic_spot_frame('stock', codes, seed=seed), 'stock')
+        inflow = pd.Series(np.random.default_rng(seed).normal(0, 5, len(df)), index=df.index)
+        samples.append((df, daily_metrics(df, inflow)))
+
+    state = RollingWindow(window)
+    started = time.perf_counter()
+    for i, day in enumerate(days[:window]):
+        state.update(day, samples[i % len(samples)][1])
+    fill_seconds = time.perf_counter() - started
+
+    remaining = iter(days[window:])
+    df_market, daily = samples[0]
+    rows = [
+        (f"fill {window} days", fill_seconds * 1000),
+        ("update (new trading day)", best_of(lambda: state.update(next(remaining), daily), repeat=extra_days)),
+        ("update (same-day rerun)", best_of(lambda: state.update(state.latest_date, daily))),
+        ("full-window recompute", best_of(state._recompute)),
+        ("aggregate + score + top 20", best_of(lambda: index.process_hot_rank_report(state, df_market, days[-1], '2026-01-01 15:00:00', min_days=window // 2))),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stock.npz')
+        rows.append(("save", best_of(lambda: state.save(path), repeat=5)))
+        rows.append(("load", best_of(lambda: RollingWindow.load(path, window), repeat=5)))
+        size = os.path.getsize(path)
+
+    print(f"\n--- {len(state)} codes, {window}-day window, state file {size / (1 << 20):.1f} MiB ---")
+    for name, ms in rows:
+        print(f"  {name:<32}{ms:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rolling hot rank state updates on synthetic market data.")
+    parser.add_argument('--codes', type=int, default=5_000, help='Number of codes.')
+    parser.add_argument('--window', type=int, default=250, help='Rolling window length in trading days.')
+    parser.add_argument('--extra-days', type=int, default=20, help='Trading days timed after the window is full.')
+    args = parser.parse_args()
+    bench(args.codes, args.window, args.extra_days)
@@ -0,0 +1,37 @@
+# benchmarks/bench_output_formats.py
+# 对比各输出格式的字节数与编码耗时 (最快一次)。默认使用仓库中的 stock_data.json 与 stock_observe_data.json。
+#
+# 用法: python benchmarks/bench_output_formats.py [文件 ...]
+
+import os
+import sys
+import json
+
+from _timing import ROOT, fastest
+from _publish import OUTPUT_FORMATS, SIDECAR_FORMATS, encode_payload, compress_sidecar, resolve_output_options
+
+DATA_DIR = os.path.join(ROOT, 'data')
+DEFAULT_FILES = [os.path.join(DATA_DIR, 'stock_data.json'), os.path.join(DATA_DIR, 'stock_observe_data.json')]
+REPEAT = 200
+
+
+def bench_file(path, sidecars):
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    print(f"\n{os.path.basename(path)}")
+    print(f"  {'format':<16}{'bytes':>10}{'encode ms':>12}")
+    for output_format in OUTPUT_FORMATS:
+        encode_seconds, data = fastest(lambda: encode_payload(payload, output_format), REPEAT)
+        encode_ms = encode_seconds * 1000
+        print(f"  {output_format:<16}{len(data):>10}{encode_ms:>12.3f}")
+        for sidecar in sidecars:
+            compress_seconds, compressed = fastest(lambda: compress_sidecar(data, sidecar), 20)
+            compress_ms = compress_seconds * 1000
+            print(f"  {output_format + '.' + sidecar:<16}{len(compressed):>10}{encode_ms + compress_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    files = sys.argv[1:] or DEFAULT_FILES
+    _, sidecars = resolve_output_options(None, SIDECAR_FORMATS)
+    for path in files:
+        bench_file(path, sidecars)
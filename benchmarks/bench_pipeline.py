@@ -0,0 +1,138 @@
+# benchmarks/bench_pipeline.py
+# api/index.py 处理流程的基准测试：用合成行情数据测量每个报表函数与输出序列化的耗时和峰值内存，
+# 结果追加到 JSON 历史文件，并与上一次相同配置的结果比较，提前发现性能回退。
+#
+# 用法:
+#   python benchmarks/bench_pipeline.py                                  # 5k/50k/500k 行，观察列表 10/1000/100000
+#   python benchmarks/bench_pipeline.py --rows 5000 --watchlists 10,100 --fail-on-regression
+
+import os
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import subprocess
+import warnings
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from io import StringIO
+
+import pandas as pd
+from _timing import ROOT, measure
+import index
+from _publish import Manifest, publish_json
+from _synthetic import synthetic_spot_frame, synthetic_watchlist
+
+DEFAULT_ROWS = [5_000, 50_000, 500_000]
+DEFAULT_WATCHLISTS = [10, 1_000, 100_000]
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'history.json')
+TRADE_DATE = '2026-08-21'
+UPDATE_TIME = '2026-08-21 15:00:00'
+
+
+def bench_rows(rows, watchlist_sizes, repeat, flow_info, hk_flow_info, output_dir):
+    raw = {market: synthetic_spot_frame(market, rows, seed=i, trade_date=TRADE_DATE) for i, market in enumerate(('etf', 'stock', 'hk_stock'))}
+    results = []
+
+    def record(name, func, watchlist=None):
+        seconds, peak_mib, result = measure(func, repeat)
+        results.append({"name": name, "rows": rows, "watchlist": watchlist, "seconds": round(seconds, 6), "peak_mib": round(peak_mib, 3)})
+        label = f"{name}" + (f" [watchlist={watchlist}]" if watchlist else "")
+        print(f"  {label:<52}{seconds * 1000:>10.2f} ms{peak_mib:>10.1f} MiB")
+        return result
+
+    frames = {}
+    for market in raw:
+        frames[market] = record(f"normalize_market_frame[{market}]", lambda market=market: index.normalize_market_frame(raw[market], market))
+    etf, stock, hk = frames['etf'], frames['stock'], frames['hk_stock']
+
+    reports = {
+        "etf_data.json": record("process_etf_report", lambda: index.process_etf_report(etf, TRADE_DATE, UPDATE_TIME)),
+        "stock_data.json": record("process_stock_report", lambda: index.process_stock_report(stock, TRADE_DATE, UPDATE_TIME)),
+        "hk_stock_data.json": record("process_hk_stock_report", lambda: index.process_hk_stock_report(hk, TRADE_DATE, UPDATE_TIME)),
+    }
+    for size in watchlist_sizes:
+        a_list = synthetic_watchlist(stock.index, size, seed=size)
+        hk_list = synthetic_watchlist(hk.index, size, seed=size + 1)
+        mixed = synthetic_watchlist(list(stock.index[:size]) + list(hk.index[:size]) + list(etf.index[:size]), size, seed=size + 2)
+        reports[f"stock_10days_data.{size}.json"] = record("process_stock_watchlist_report", lambda: index.process_stock_watchlist_report(stock, TRADE_DATE, a_list, UPDATE_TIME), size)
+        reports[f"hk_stock_10days_data.{size}.json"] = record("process_hk_stock_watchlist_report", lambda: index.process_hk_stock_watchlist_report(hk, TRADE_DATE, hk_list, UPDATE_TIME), size)
+        reports[f"stock_observe_data.{size}.json"] = record("process_observe_list_report", lambda: index.process_observe_list_report(stock, etf, hk, TRADE_DATE, mixed, UPDATE_TIME), size)
+        reports[f"stock_dynamic_data.{size}.json"] = record("process_dynamic_a_share_report", lambda: index.process_dynamic_a_share_report(stock, TRADE_DATE, a_list, flow_info, UPDATE_TIME), size)
+        reports[f"hk_stock_dynamic_data.{size}.json"] = record("process_dynamic_hk_share_report", lambda: index.process_dynamic_hk_share_report(hk, TRADE_DATE, hk_list, hk_flow_info, UPDATE_TIME), size)
+
+    # 序列化：与 index.py 中 save_report_task 相同的 publish_json 路径 (内容哈希 + 编码 + 写文件)，每次使用新的 manifest 以强制写入
+    for output_format in ('pretty', 'minified', 'columnar'):
+        def save_all():
+            manifest = Manifest(output_dir)
+            for file, payload in reports.items():
+                publish_json(output_dir, file, payload, manifest, UPDATE_TIME, output_format)
+        record(f"serialize[{output_format}]", save_all)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_with_previous(history, results, threshold):
+    """与历史中最近一次出现的相同 (name, rows, watchlist) 比较，返回变慢超过 threshold 倍的条目。"""
+    previous = {}
+    for run in history:
+        for item in run['results']:
+            previous[(item['name'], item['rows'], item['watchlist'])] = item
+    regressions = []
+    for item in results:
+        before = previous.get((item['name'], item['rows'], item['watchlist']))
+        # 小于 1ms 的测量噪声较大，不参与比较
+        if before and before['seconds'] >= 0.001 and item['seconds'] > before['seconds'] * threshold:
+            regressions.append((item, before))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the api/index.py processing pipeline on synthetic market data.")
+    parser.add_argument('--rows', default=','.join(map(str, DEFAULT_ROWS)), help='Comma-separated rows per market.')
+    parser.add_argument('--watchlists', default=','.join(map(str, DEFAULT_WATCHLISTS)), help='Comma-separated watchlist sizes.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions; the fastest is recorded.')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='JSON file the results are appended to.')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Slowdown factor reported as a regression.')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore', FutureWarning)
+
+    with redirect_stdout(StringIO()):
+        flow_info = index.read_flow_info_base(os.path.join(ROOT, 'data', 'FlowInfoBase.json'))
+        hk_flow_info = index.read_flow_info_base(os.path.join(ROOT, 'data', 'HKFlowInfoBase.json'))
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for rows in [int(r) for r in args.rows.split(',') if r]:
+            print(f"\n--- {rows} rows per market ---")
+            results += bench_rows(rows, [int(w) for w in args.watchlists.split(',') if w], args.repeat, flow_info, hk_flow_info, output_dir)
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    regressions = compare_with_previous(history, results, args.threshold)
+    history.append({
+        "timestamp": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "results": results,
+    })
+    with open(args.history, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=4)
+    print(f"\nResults appended to {args.history}")
+
+    for item, before in regressions:
+        label = f"{item['name']} rows={item['rows']}" + (f" watchlist={item['watchlist']}" if item['watchlist'] else "")
+        print(f"REGRESSION: {label}: {before['seconds'] * 1000:.2f} ms -> {item['seconds'] * 1000:.2f} ms")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
@@ -0,0 +1,73 @@
+# benchmarks/bench_sector.py
+# 行业聚合报表 (index.process_sector_report) 的基准测试：为合成A股行情生成覆盖全部代码的合成 FlowInfoBase.json
+# (经由与生产相同的 read_flow_info_base 二进制缓存读取)，分别测量 flow info 查询、整个报表函数与 JSON 写出的耗时。
+#
+# 用法:
+#   python benchmarks/bench_sector.py                         # 5k 行，约 130 个行业
+#   python benchmarks/bench_sector.py --rows 5000,50000 --sectors 300
+
+import os
+import json
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+
+from _timing import best_of
+import index
+from _publish import Manifest, publish_json
+from _synthetic import synthetic_spot_frame
+
+TRADE_DATE = '2026-08-21'
+UPDATE_TIME = '2026-08-21 15:00:00'
+
+
+def write_synthetic_flow_info(path, codes, sectors, seed=0):
+    """为 codes 生成 FlowInfoBase.json 形式的记录: 约 3% 没有行业，PotScore 与均线标记各约 2% 缺失。"""
+    rng = np.random.default_rng(seed)
+    n = len(codes)
+    sector = rng.integers(0, sectors, n)
+    no_sector, no_score, no_ma = (rng.random(n) < ratio for ratio in (0.03, 0.02, 0.02))
+    pot_score, ma_up = rng.normal(0, 1, n), rng.random(n) < 0.4
+    records = [{
+        '日期': TRADE_DATE,
+        '代码': code,
+        'PotScore': None if no_score[i] else round(float(pot_score[i]), 6),
+        'l2name': None if no_sector[i] else f"行业{sector[i]:03d}II",
+        'Price20-day-MA_IsUp': None if no_ma[i] else bool(ma_up[i]),
+    } for i, code in enumerate(codes)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False)
+
+
+def bench(rows, sectors, tmp):
+    df_stock = index.normalize_market_frame(synthetic_spot_frame('stock', rows, trade_date=TRADE_DATE), 'stock')
+    flow_path = os.path.join(tmp, f"FlowInfoBase.{rows}.json")
+    write_synthetic_flow_info(flow_path, list(df_stock.index), sectors)
+    with redirect_stdout(StringIO()):
+        flow_info = index.read_flow_info_base(flow_path)
+        report = index.process_sector_report(df_stock, TRADE_DATE, flow_info, UPDATE_TIME)
+
+    def publish():
+        publish_json(tmp, index.SECTOR_FILE, report, Manifest(tmp), UPDATE_TIME)
+
+    timings = [
+        ("flow info lookup", best_of(lambda: flow_info.lookup(df_stock.index, index.SECTOR_FLOW_FIELDS))),
+        ("process_sector_report", best_of(lambda: index.process_sector_report(df_stock, TRADE_DATE, flow_info, UPDATE_TIME))),
+        ("publish_json", best_of(publish)),
+    ]
+    print(f"\n--- {rows} stocks, {len(report['sectors'])} sectors ---")
+    for name, ms in timings:
+        print(f"  {name:<32}{ms:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the A-share sector aggregation report on synthetic data.")
+    parser.add_argument('--rows', default='5000', help='Comma-separated numbers of A-share rows.')
+    parser.add_argument('--sectors', type=int, default=130, help='Number of synthetic sectors.')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in [int(r) for r in args.rows.split(',') if r]:
+            bench(rows, args.sectors, tmp)
@@ -0,0 +1,7 @@
+# tests/conftest.py
+# api/ 下的模块以同级模块方式互相导入 (from _fetch import ...)，测试时把 api/ 加入导入路径
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
@@ -0,0 +1,77 @@
+# tests/test_delta.py
+
+import json
+import random
+
+import pytest
+
+from _delta import apply_delta, compute_delta, write_delta
+
+NAN = float('nan')
+
+
+def dumps(payload):
+    # NaN != NaN，按发布时的 JSON 文本比较 (完整文件中 NaN 与 null 是不同的值)
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True)
+
+
+def record(code, price, percent, update_time='2026-08-21 14:45:00'):
+    return {'代码': code, '名称': f"股{code}", 'Price': price, 'Percent': percent, 'update_time_bjt': update_time, 'trade_date': '2026-08-21'}
+
+
+def random_records(rng, update_time, duplicates):
+    codes = rng.sample([f"{n:06d}" for n in range(12)], rng.randint(0, 8))
+    if duplicates and codes:
+        codes.insert(rng.randrange(len(codes) + 1), rng.choice(codes))
+    values = [1.0, 2.5, NAN, None]
+    return [record(code, rng.choice(values), rng.choice(values), update_time) for code in codes]
+
+
+def round_trip(old, new, tmp_path):
+    write_delta(str(tmp_path), 'x.json', old, new, seq=2)
+    with open(tmp_path / 'x.delta.json', 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    return document, apply_delta(json.loads(dumps(old)), document)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_round_trip_records(seed, tmp_path):
+    rng = random.Random(seed)
+    duplicates = seed % 3 == 0
+    old = random_records(rng, '2026-08-21 14:45:00', duplicates)
+    new = random_records(rng, '2026-08-21 15:00:00', duplicates)
+    document, patched = round_trip(old, new, tmp_path)
+    if document.get('reset'):
+        assert patched is None
+    else:
+        assert dumps(patched) == dumps(new)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_round_trip_top_report(seed, tmp_path):
+    rng = random.Random(seed)
+    old = {'update_time_bjt': '2026-08-21 14:45:00', 'trade_date': '2026-08-21', 'top_up_20': random_records(rng, '2026-08-21 14:45:00', False)}
+    new = {'update_time_bjt': '2026-08-21 15:00:00', 'trade_date': '2026-08-21', 'top_up_20': random_records(rng, '2026-08-21 15:00:00', False)}
+    document, patched = round_trip(old, new, tmp_path)
+    assert not document.get('reset')
+    assert dumps(patched) == dumps(new)
+
+
+def test_duplicate_codes_reset():
+    old = [record('600519', 1.0, 1.0), record('600519', 1.0, 1.0)]
+    new = [record('600519', 2.0, 1.0), record('600519', 2.0, 1.0)]
+    assert compute_delta(old, new) is None
+    assert compute_delta([record('600519', 1.0, 1.0)], new) is None
+
+
+def test_nan_and_none_are_distinct():
+    delta = compute_delta([record('600519', NAN, None)], [record('600519', None, NAN)])
+    assert delta['sections']['rows']['changed'][0].keys() == {'代码', 'Price', 'Percent'}
+    assert compute_delta([record('600519', NAN, None)], [record('600519', NAN, None)]) == {'fields': {}, 'sections': {}}
+
+
+def test_list_without_codes_is_replaced_whole(tmp_path):
+    old = {'update_time_bjt': '2026-08-21 14:45:00', 'trade_date': '2026-08-21', 'sectors': [{'l2name': '白酒II', 'Percent': 1.0}]}
+    new = {'update_time_bjt': '2026-08-21 15:00:00', 'trade_date': '2026-08-21', 'sectors': [{'l2name': '白酒II', 'Percent': NAN}]}
+    document, patched = round_trip(old, new, tmp_path)
+    assert dumps(patched) == dumps(new)
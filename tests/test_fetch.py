@@ -0,0 +1,56 @@
+# tests/test_fetch.py
+
+import time
+
+import pandas as pd
+
+from _fetch import StubFetcher, fetch_market_snapshots, fetch_with_retry, resolve_trade_date
+
+FRAME = pd.DataFrame({'代码': ['510300', '159915'], '最新价': [4.0, 2.5]})
+
+
+def test_sources_are_fetched_concurrently():
+    fetchers = {name: StubFetcher(FRAME, latency=latency) for name, latency in (('etf', 0.3), ('stock', 0.4), ('hk_stock', 0.5))}
+    started = time.perf_counter()
+    snapshots = fetch_market_snapshots(fetchers, timeout=5, retries=0)
+    elapsed = time.perf_counter() - started
+    assert 0.5 <= elapsed < 0.9 # 约等于最慢的数据源，而不是三者之和 (1.2s)
+    assert all(len(df) == 2 for df in snapshots.values())
+
+
+def test_retry_then_success():
+    fetcher = StubFetcher(FRAME, failures=1)
+    df = fetch_with_retry('etf', fetcher, timeout=5, retries=2, backoff=0.01)
+    assert fetcher.calls == 2
+    pd.testing.assert_frame_equal(df, FRAME)
+
+
+def test_exhausted_retries_return_empty_frame():
+    fetcher = StubFetcher(FRAME, failures=5)
+    df = fetch_with_retry('etf', fetcher, timeout=5, retries=2, backoff=0.01)
+    assert fetcher.calls == 3
+    assert df.empty
+
+
+def test_timeout_is_not_retried():
+    fetcher = StubFetcher(FRAME, latency=0.5)
+    started = time.perf_counter()
+    df = fetch_with_retry('etf', fetcher, timeout=0.05, retries=2, backoff=0.01)
+    assert time.perf_counter() - started < 0.3
+    assert fetcher.calls == 1
+    assert df.empty
+
+
+def test_source_timeout_error_is_retried():
+    # 数据源自身抛出的 TimeoutError (如 requests 的读超时) 与 FetchTimeout 不同，仍按普通错误重试
+    fetcher = StubFetcher(FRAME, failures=1, error=TimeoutError("read timed out"))
+    df = fetch_with_retry('etf', fetcher, timeout=5, retries=1, backoff=0.01)
+    assert fetcher.calls == 2 and len(df) == 2
+
+
+def test_resolve_trade_date():
+    assert resolve_trade_date(pd.DataFrame({'数据日期': ['2026-08-21']}), '2026-08-20') == '2026-08-21'
+    assert resolve_trade_date(pd.DataFrame(), '2026-08-20') == '2026-08-20'
+    assert resolve_trade_date(FRAME, '2026-08-20') == '2026-08-20'
+    assert resolve_trade_date(pd.DataFrame({'数据日期': ['-']}), '2026-08-20') == '2026-08-20'
+    assert resolve_trade_date(pd.DataFrame({'数据日期': [None]}), '2026-08-20') == '2026-08-20'
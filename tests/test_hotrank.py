@@ -0,0 +1,71 @@
+# tests/test_hotrank.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from _hotrank import RollingWindow
+
+
+def daily(values):
+    codes = pd.Index([str(i) for i in range(len(values))], name='代码')
+    return pd.DataFrame({'名称': list(codes), 'return': 0.0, 'amount': values, 'inflow': values}, index=codes)
+
+
+def days(count):
+    return [day.strftime('%Y-%m-%d') for day in pd.bdate_range('2026-01-01', periods=count)]
+
+
+def naive_amount(history, window):
+    """最近 window 个交易日的成交额之和 (对照实现)。"""
+    return sum(history[-window:])
+
+
+@pytest.mark.parametrize('new_window', [2, 5, 20])
+def test_resize_partly_filled_window(new_window):
+    state = RollingWindow(10)
+    history = []
+    for i, day in enumerate(days(3)):
+        state.update(day, daily([float(i + 1)]))
+        history.append(float(i + 1))
+    state.resize(new_window)
+    assert state.latest_date == days(3)[-1]
+    assert state.trade_dates() == days(3)[-new_window:]
+    assert state.aggregates()['Amount'].iloc[0] == pytest.approx(naive_amount(history, new_window))
+
+    # 调整后继续更新，窗口内的天数与滚动和都应与对照实现一致
+    for i, day in enumerate(days(3 + 2 * new_window)[3:]):
+        state.update(day, daily([float(i + 10)]))
+        history.append(float(i + 10))
+        assert len(state.trade_dates()) == min(len(history), new_window)
+        assert state.aggregates()['Amount'].iloc[0] == pytest.approx(naive_amount(history, new_window))
+
+
+def test_resize_full_window_keeps_latest_days():
+    state = RollingWindow(4)
+    for i, day in enumerate(days(6)):
+        state.update(day, daily([float(i)]))
+    state.resize(3)
+    assert state.trade_dates() == days(6)[-3:]
+    state.resize(8)
+    assert state.trade_dates() == days(6)[-3:]
+    assert state.latest_date == days(6)[-1]
+
+
+def test_resize_empty_window():
+    state = RollingWindow(10)
+    state.resize(5)
+    assert state.latest_date is None
+    state.update(days(1)[0], daily([1.0]))
+    assert state.trade_dates() == days(1)
+
+
+def test_save_load_with_different_window(tmp_path):
+    state = RollingWindow(10)
+    for i, day in enumerate(days(3)):
+        state.update(day, daily([1.0, float(i)]))
+    path = str(tmp_path / 'stock.npz')
+    state.save(path)
+    loaded = RollingWindow.load(path, 5)
+    assert loaded.latest_date == days(3)[-1]
+    np.testing.assert_allclose(loaded.aggregates()['Amount'], state.aggregates()['Amount'])
@@ -0,0 +1,22 @@
+# tests/test_metrics.py
+
+import json
+import os
+
+from _metrics import METRICS_FILE, METRICS_LOG, RunMetrics
+
+
+def test_write_keeps_only_recent_log_lines(tmp_path):
+    for run in range(5):
+        metrics = RunMetrics()
+        metrics.info['run'] = run
+        with metrics.span('process', 'report') as span:
+            span['rows'] = run
+        metrics.write(str(tmp_path), max_log_lines=3)
+
+    with open(os.path.join(tmp_path, METRICS_LOG), encoding='utf-8') as f:
+        runs = [json.loads(line)['run'] for line in f]
+    assert runs == [2, 3, 4]
+    with open(os.path.join(tmp_path, METRICS_FILE), encoding='utf-8') as f:
+        assert json.load(f)['run'] == 4
+    assert sorted(os.listdir(tmp_path)) == [METRICS_FILE, METRICS_LOG]
@@ -0,0 +1,83 @@
+# tests/test_quotes.py
+
+import pandas as pd
+import pytest
+
+from _fetch import StubFetcher
+from _quotes import FrameQuoteSource, fetch_planned_snapshots, group_codes, market_of_code, plan_fetch, secid
+
+FRAMES = {
+    'etf': pd.DataFrame({'代码': ['510300', '159915', '588000'], '最新价': [4.0, 2.5, 1.0]}),
+    'stock': pd.DataFrame({'代码': ['600519', '000001', '920001'], '最新价': [1500.0, 10.0, 20.0]}),
+    'hk_stock': pd.DataFrame({'代码': ['00700', '09988'], '最新价': [400.0, 80.0]}),
+}
+
+
+@pytest.mark.parametrize('code, market, sid', [
+    ('00700', 'hk_stock', '116.00700'),
+    ('09988', 'hk_stock', '116.09988'),
+    ('510300', 'etf', '1.510300'),
+    ('588000', 'etf', '1.588000'),
+    ('159915', 'etf', '0.159915'),
+    ('600519', 'stock', '1.600519'),
+    ('000001', 'stock', '0.000001'),
+    ('300750', 'stock', '0.300750'),
+    ('900901', 'stock', '1.900901'), # 沪市 B 股
+    ('920001', 'stock', '0.920001'), # 北交所
+])
+def test_market_of_code_and_secid(code, market, sid):
+    assert market_of_code(code) == market
+    assert secid(code, market) == sid
+
+
+def test_group_codes_dedupes_in_order():
+    grouped = group_codes(['600519', '00700', '510300'], ['600519', '000001'])
+    assert grouped == {'etf': ['510300'], 'stock': ['600519', '000001'], 'hk_stock': ['00700']}
+
+
+def test_plan_fetch_modes():
+    codes = group_codes(['600519', '00700'])
+    assert plan_fetch(codes, 'full', full_reports_due=False).strategy == 'full'
+    assert plan_fetch(codes, 'targeted', full_reports_due=True).strategy == 'targeted'
+    assert plan_fetch(codes, 'auto', full_reports_due=True).strategy == 'full'
+    assert plan_fetch(codes, 'auto', full_reports_due=False).strategy == 'targeted'
+    with pytest.raises(ValueError):
+        plan_fetch(codes, 'partial')
+
+
+def test_plan_fetch_targeted_limit():
+    codes = {'etf': [], 'stock': [f"{i:06d}" for i in range(3)], 'hk_stock': ['00700', '09988']}
+    assert plan_fetch(codes, 'auto', full_reports_due=False, max_codes=5).strategy == 'targeted'
+    assert plan_fetch(codes, 'auto', full_reports_due=False, max_codes=4).strategy == 'full'
+
+
+def stub_fetchers():
+    return {market: StubFetcher(frame) for market, frame in FRAMES.items()}
+
+
+def test_targeted_fetch_only_requests_codes():
+    fetchers = stub_fetchers()
+    plan = plan_fetch(group_codes(['600519', '00700']), 'targeted')
+    snapshots = fetch_planned_snapshots(plan, fetchers, FrameQuoteSource(FRAMES))
+    assert list(snapshots['stock']['代码']) == ['600519']
+    assert list(snapshots['hk_stock']['代码']) == ['00700']
+    assert snapshots['etf'].empty
+    assert all(fetcher.calls == 0 for fetcher in fetchers.values())
+
+
+def test_targeted_fetch_falls_back_to_full_market():
+    fetchers = stub_fetchers()
+    frames = dict(FRAMES, hk_stock=pd.DataFrame())
+    plan = plan_fetch(group_codes(['600519', '00700']), 'targeted')
+    snapshots = fetch_planned_snapshots(plan, fetchers, FrameQuoteSource(frames), backoff=0.01)
+    assert list(snapshots['stock']['代码']) == ['600519']
+    pd.testing.assert_frame_equal(snapshots['hk_stock'], FRAMES['hk_stock'])
+    assert (fetchers['etf'].calls, fetchers['stock'].calls, fetchers['hk_stock'].calls) == (0, 0, 1)
+
+
+def test_full_plan_downloads_every_market():
+    fetchers = stub_fetchers()
+    quote_source = FrameQuoteSource(FRAMES)
+    snapshots = fetch_planned_snapshots(plan_fetch(group_codes(['600519']), 'full'), fetchers, quote_source)
+    assert {market: len(df) for market, df in snapshots.items()} == {'etf': 3, 'stock': 3, 'hk_stock': 2}
+    assert quote_source.calls == 0
@@ -0,0 +1,50 @@
+# tests/test_reports.py
+# 观察列表类报表与旧版实现的一致性: fixtures/report_expected.json 由基线版本 (d49dc90) 的 index.py 在
+# fixtures/report_snapshot.json (含 '-' 与 None 单元格的合成快照) 上生成，比较前去掉 update_time_bjt。
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import index
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+TRADE_DATE = '2026-08-21'
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    snapshot = load_fixture('report_snapshot.json')
+    frames = {market: index.normalize_market_frame(pd.DataFrame(snapshot[market]), market) for market in ('etf', 'stock', 'hk_stock')}
+    return snapshot, frames
+
+
+def dumps(records):
+    """按 JSON 文本比较，NaN 与 null 的区别、浮点数的取整结果都会体现出来。"""
+    records = [{key: value for key, value in record.items() if key != 'update_time_bjt'} for record in records]
+    return json.dumps(records, ensure_ascii=False, sort_keys=True, indent=1)
+
+
+def test_stock_watchlist_matches_baseline(snapshot):
+    lists, frames = snapshot
+    result = index.process_stock_watchlist_report(frames['stock'], TRADE_DATE, lists['watchlist'])
+    assert dumps(result) == dumps(load_fixture('report_expected.json')['watchlist'])
+
+
+def test_hk_watchlist_matches_baseline(snapshot):
+    lists, frames = snapshot
+    result = index.process_hk_stock_watchlist_report(frames['hk_stock'], TRADE_DATE, lists['hk_watchlist'])
+    assert dumps(result) == dumps(load_fixture('report_expected.json')['hk_watchlist'])
+
+
+def test_observe_list_matches_baseline(snapshot):
+    lists, frames = snapshot
+    result = index.process_observe_list_report(frames['stock'], frames['etf'], frames['hk_stock'], TRADE_DATE, lists['observe'])
+    assert dumps(result) == dumps(load_fixture('report_expected.json')['observe'])
@@ -0,0 +1,147 @@
+# tests/test_server.py
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from _server import QueryCoalescer, SnapshotStore, create_server
+from _synthetic import stub_fetchers
+
+
+class CountingFetchers(dict):
+    """包装 stub_fetchers，记录每个数据源的调用次数；empty 中的数据源返回空表 (即拉取失败)。"""
+
+    def __init__(self, latency=0.0, **rows):
+        super().__init__()
+        self.calls = {}
+        self.empty = set()
+        for market, fetch in stub_fetchers(rows=rows, latency=latency).items():
+            self[market] = self._wrap(market, fetch)
+
+    def _wrap(self, market, fetch):
+        def call():
+            self.calls[market] = self.calls.get(market, 0) + 1
+            return pd.DataFrame() if market in self.empty else fetch()
+        return call
+
+
+def small_fetchers(latency=0.0):
+    return CountingFetchers(latency=latency, etf=50, stock=200, hk_stock=100)
+
+
+def test_concurrent_refreshes_share_one_fetch():
+    fetchers = small_fetchers(latency=0.2)
+    store = SnapshotStore(fetchers)
+    futures = [store.refresh() for _ in range(5)]
+    assert all(future is futures[0] for future in futures)
+    snapshots = {future.result().version for future in futures}
+    assert snapshots == {1}
+    assert fetchers.calls == {'etf': 1, 'stock': 1, 'hk_stock': 1}
+
+
+def test_stale_snapshot_is_served_while_refreshing():
+    fetchers = small_fetchers(latency=0.3)
+    store = SnapshotStore(fetchers, refresh_interval=0.0, max_stale=60)
+    first = store.refresh().result()
+    started = time.monotonic()
+    assert store.get() is first # 旧快照立即返回，刷新在后台进行
+    assert time.monotonic() - started < 0.2
+    assert store.refresh().result().version == 2
+    assert store.get().version >= 2
+
+
+def test_too_stale_snapshot_waits_for_refresh():
+    store = SnapshotStore(small_fetchers(latency=0.1), refresh_interval=0.0, max_stale=0.0)
+    store.refresh().result()
+    assert store.get().version == 2
+
+
+def test_failed_source_keeps_previous_frame():
+    fetchers = small_fetchers()
+    store = SnapshotStore(fetchers)
+    first = store.refresh().result()
+    fetchers.empty.add('hk_stock')
+    second = store.refresh().result()
+    assert second.version == 2
+    assert second.frames['hk_stock'] is first.frames['hk_stock']
+    assert second.frames['stock'] is not first.frames['stock']
+
+
+def test_all_sources_failing_without_previous_snapshot_raises():
+    fetchers = small_fetchers()
+    fetchers.empty.update(fetchers)
+    with pytest.raises(RuntimeError):
+        SnapshotStore(fetchers).refresh().result()
+
+
+def test_query_coalescer_runs_identical_queries_once():
+    coalescer = QueryCoalescer()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(1)
+        return ['result']
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.run(1, 'key', compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and results == [['result']] * 5
+    # 同一版本命中缓存，新版本重新计算
+    assert coalescer.run(1, 'key', compute) == ['result'] and len(calls) == 1
+    coalescer.run(2, 'key', compute)
+    assert len(calls) == 2
+
+
+def test_query_coalescer_does_not_cache_errors():
+    coalescer = QueryCoalescer()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        coalescer.run(1, 'key', fail)
+    assert coalescer.run(1, 'key', lambda: 'ok') == 'ok'
+
+
+@pytest.fixture
+def server(tmp_path):
+    server, store = create_server('127.0.0.1', 0, small_fetchers(), str(tmp_path))
+    store.refresh().result()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=body, method='POST', headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize('body', [b'[1, 2]', b'"600519"', b'null', b'{bad json', b'\xff\xfe'])
+def test_post_rejects_non_object_bodies(server, body):
+    status, payload = post(server + '/', body)
+    assert status == 400 and 'error' in payload
+
+
+def test_post_dynamic_list(server):
+    status, payload = post(server + '/', json.dumps({"dynamiclist": ["000000", "300000"]}).encode())
+    assert status == 200
+    assert [row['代码'] for row in payload['dynamiclist']] == ['000000', '300000']
+    assert payload['snapshot_version'] == 1
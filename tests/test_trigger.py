@@ -0,0 +1,57 @@
+# tests/test_trigger.py
+
+import threading
+
+from trigger import DispatchCoalescer
+
+
+class RecordingDispatch:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, a_codes, hk_codes):
+        self.calls.append((a_codes, hk_codes))
+        return {"status": "dispatched", "sent_inputs": {}}
+
+
+def make_coalescer(window=0.0):
+    dispatch = RecordingDispatch()
+    return DispatchCoalescer(dispatch, window=window, inflight_ttl=300), dispatch
+
+
+def test_full_refresh_is_not_covered_by_list_run():
+    coalescer, dispatch = make_coalescer()
+    assert coalescer.submit(['600519'], [])['status'] == 'dispatched'
+    assert coalescer.submit([], [])['status'] == 'dispatched'
+    assert coalescer.submit([], [])['status'] == 'covered'
+    assert dispatch.calls == [(['600519'], []), ([], [])]
+
+
+def test_later_list_run_replaces_coverage():
+    coalescer, dispatch = make_coalescer()
+    assert coalescer.submit(['600519'], [])['status'] == 'dispatched'
+    assert coalescer.submit(['600519'], [])['status'] == 'covered'
+    assert coalescer.submit(['000001'], [])['status'] == 'dispatched'
+    # 第二次运行覆盖了 stock_dynamic_data.json，600519 不再在其中
+    assert coalescer.submit(['600519'], [])['status'] == 'dispatched'
+    # 只带A股代码的运行不会覆盖港股文件
+    assert coalescer.submit([], ['00700'])['status'] == 'dispatched'
+    assert coalescer.submit(['000001'], [])['status'] == 'dispatched'
+    assert coalescer.submit([], ['00700'])['status'] == 'covered'
+
+
+def test_full_refresh_and_list_requests_are_batched_separately():
+    coalescer, dispatch = make_coalescer(window=0.2)
+    results = {}
+
+    def submit(name, a_codes):
+        results[name] = coalescer.submit(a_codes, [])
+
+    threads = [threading.Thread(target=submit, args=args) for args in (('list', ['600519']), ('full', []), ('list2', ['000001']))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted((sorted(a_codes), hk_codes) for a_codes, hk_codes in dispatch.calls) == [([], []), (['000001', '600519'], [])]
+    assert results['list']['merged_requests'] == 2 and results['full']['merged_requests'] == 1